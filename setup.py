@@ -23,8 +23,10 @@ setup(
     description="A data_process Python project",  # Optional
     long_description=long_description,  # Optional
     long_description_content_type="text/markdown",  # Optional (see note above)
-    package_dir={"": "src"},  # Optional
-    packages=find_packages(where="src"),  # Required
+    # the pattern files of data/pattern are installed as classfier/pattern, where CommitClassfier looks for them
+    package_dir={"": "src", "classfier.pattern": "data/pattern"},  # Optional
+    packages=find_packages(where="src") + ["classfier.pattern"],  # Required
+    package_data={"classfier.pattern": ["*.txt"]},  # Optional
     python_requires=">=3.7, <4",
     install_requires=["peppercorn"],  # Optional
     # List additional groups of dependencies here (e.g. development
@@ -38,12 +40,13 @@ setup(
     extras_require={  # Optional
         "dev": ["check-manifest"],
         "test": ["coverage"],
+        "profile": ["regex"],
     },
-    # For example, the following would provide a command called `data_process` which
-    # executes the function `main` from this package when invoked:
+    # The following provides a command called `commit-classify` which executes the
+    # function `main` of the classifier command line interface when invoked:
     entry_points={  # Optional
         "console_scripts": [
-            "data_process=data_process:main",
+            "commit-classify=classfier.ClassifierCli:main",
         ],
     },
 )
@@ -0,0 +1,191 @@
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+import pandas as pd
+
+DIMENSIONS = {"why": "why_subcategory", "what": "what_subcategory"}
+ALL_LANGUAGES = "all"
+
+
+def category_lists(column: pd.Series, separator: str = ";", normalize: bool = False) -> pd.Series:
+    """
+    return the categories of every row as a list; cells may already be lists (classifier output) or hold the
+    categories joined by separator (labelled data and CSV output). With normalize, names are lower-cased and stripped
+    """
+    lists = column.map(lambda cell: list(cell) if isinstance(cell, (list, tuple))
+                       else [] if not isinstance(cell, str) or not cell.strip()
+                       else [name.strip() for name in cell.split(separator)])
+    if normalize:
+        lists = lists.map(lambda names: [name.lower() for name in names])
+    return lists
+
+
+class CategoryStatistics:
+    """
+    Counts of classified (or labelled) commits: messages per language, occurrences of every why and what category
+    per language, and why/what co-occurrences per language. Statistics of separate shards are combined with merge (or
+    +) into the statistics of all of them, so large outputs can be aggregated chunk by chunk and in parallel, and the
+    saved aggregates are all charts need
+    """
+
+    def __init__(self):
+        self.messages = Counter()
+        self.good = Counter()
+        self.frequency = Counter()
+        self.cooccurrence = Counter()
+
+    def update(self, df: pd.DataFrame, language_column: str = "language", separator: str = ";",
+               normalize: bool = False) -> "CategoryStatistics":
+        """
+        add the rows of a DataFrame with why_subcategory and what_subcategory columns (and optionally a language
+        column and the good_classified flag of classifier output)
+        """
+        languages = (df[language_column].astype(str) if language_column in df.columns
+                     else pd.Series(ALL_LANGUAGES, index=df.index)).reset_index(drop=True)
+        self.messages.update(languages.value_counts().to_dict())
+        if "good_classified" in df.columns:
+            good = df["good_classified"].astype(str).str.lower().eq("true").to_numpy()
+            self.good.update(languages[good].value_counts().to_dict())
+
+        lists = {dimension: category_lists(df[column], separator, normalize).reset_index(drop=True)
+                 for dimension, column in DIMENSIONS.items()}
+        for dimension, categories in lists.items():
+            exploded = pd.DataFrame({"language": languages, "category": categories}).explode("category").dropna()
+            self.frequency.update({(language, dimension, category): int(count) for (language, category), count
+                                   in exploded.value_counts().items()})
+        pairs = pd.DataFrame({"language": languages, **lists}).explode("why").explode("what").dropna()
+        self.cooccurrence.update({key: int(count) for key, count in pairs.value_counts().items()})
+        return self
+
+    def merge(self, other: "CategoryStatistics") -> "CategoryStatistics":
+        for counter, other_counter in zip(self.counters(), other.counters()):
+            counter.update(other_counter)
+        return self
+
+    def __add__(self, other: "CategoryStatistics") -> "CategoryStatistics":
+        return CategoryStatistics().merge(self).merge(other)
+
+    def counters(self) -> tuple:
+        return self.messages, self.good, self.frequency, self.cooccurrence
+
+    def languages(self) -> list[str]:
+        return sorted(self.messages)
+
+    def frequencies(self, dimension: str, language: str = None) -> pd.Series:
+        """
+        return the number of occurrences of every category of dimension "why" or "what", in one language or in all,
+        most frequent first
+        """
+        counts = Counter()
+        for (lang, dim, category), count in self.frequency.items():
+            if dim == dimension and (language is None or lang == language):
+                counts[category] += count
+        return pd.Series(counts, dtype="int64").sort_values(ascending=False, kind="stable")
+
+    def cooccurrence_matrix(self, language: str = None) -> pd.DataFrame:
+        """
+        return how often every why category occurs together with every what category, why categories as rows
+        """
+        counts = Counter()
+        for (lang, why, what), count in self.cooccurrence.items():
+            if language is None or lang == language:
+                counts[(why, what)] += count
+        if not counts:
+            return pd.DataFrame(dtype="int64")
+        series = pd.Series(counts, dtype="int64")
+        return series.unstack(fill_value=0).rename_axis(index="why", columns="what")
+
+    def to_dict(self) -> dict:
+        return {
+            "messages": self.messages,
+            "good": self.good,
+            "frequency": [[*key, count] for key, count in sorted(self.frequency.items())],
+            "cooccurrence": [[*key, count] for key, count in sorted(self.cooccurrence.items())],
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "CategoryStatistics":
+        stats = cls()
+        stats.messages.update(d["messages"])
+        stats.good.update(d["good"])
+        stats.frequency.update({tuple(row[:-1]): row[-1] for row in d["frequency"]})
+        stats.cooccurrence.update({tuple(row[:-1]): row[-1] for row in d["cooccurrence"]})
+        return stats
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def load(cls, path: str) -> "CategoryStatistics":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def read_chunks(path: str, chunk_size: int = 100000) -> Iterator[pd.DataFrame]:
+    """
+    read classifier output (CSV or JSONL, see classfier.ClassifierCli) or labelled CSV chunk by chunk
+    """
+    if path.endswith(".jsonl"):
+        return pd.read_json(path, lines=True, dtype=False, chunksize=chunk_size)
+    return pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size)
+
+
+def aggregate_file(path: str, chunk_size: int = 100000, separator: str = ";",
+                   normalize: bool = False) -> CategoryStatistics:
+    """
+    compute the statistics of one file in a single streaming pass
+    """
+    stats = CategoryStatistics()
+    for chunk in read_chunks(path, chunk_size):
+        stats.update(chunk, separator=separator, normalize=normalize)
+    return stats
+
+
+def _aggregate_file(args: tuple) -> CategoryStatistics:
+    return aggregate_file(*args)
+
+
+def aggregate_files(paths: list[str], workers: int = 1, chunk_size: int = 100000, separator: str = ";",
+                    normalize: bool = False) -> CategoryStatistics:
+    """
+    compute the statistics of several files (e.g. the shards of a large output), one file per process with workers >
+    1, and merge them
+    """
+    tasks = [(path, chunk_size, separator, normalize) for path in paths]
+    stats = CategoryStatistics()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for shard_stats in pool.map(_aggregate_file, tasks):
+                stats.merge(shard_stats)
+    else:
+        for task in tasks:
+            stats.merge(_aggregate_file(task))
+    return stats
+
+
+def render_charts(stats: CategoryStatistics, out_dir: str, language: str = None, dpi: int = 600,
+                  show: bool = False) -> list[str]:
+    """
+    draw the why and what category distributions of saved statistics as horizontal bar charts, return the files
+    written
+    """
+    import matplotlib.pyplot as plt
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for dimension, color in (("what", None), ("why", "peru")):
+        frequencies = stats.frequencies(dimension, language)
+        plt.figure()
+        plt.barh(frequencies.index, frequencies.values, color=color)
+        plt.title("{} subcategory".format(dimension))
+        path = os.path.join(out_dir, "{}_subcategory_distribution.png".format(dimension))
+        plt.savefig(path, dpi=dpi, format="png", bbox_inches="tight")
+        paths.append(path)
+        if show:
+            plt.show()
+        plt.close()
+    return paths
@@ -1,33 +1,34 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+import argparse
+import os
 
-final_df = pd.read_csv("../../data/eval/train_set.csv")
+from analyze.CategoryStatistics import CategoryStatistics, aggregate_files, render_charts
+from project_path import ROOT_DIR
 
-def flatten_lst(df, col):
-    original_col = df[col].apply(lambda s: s.split(";"))
-    flattened_lst = [item.strip().lower() for sublist in original_col for item in sublist]
-    return flattened_lst
+TRAIN_SET_FILE = os.path.join(ROOT_DIR, "data/eval/train_set.csv")
+CHART_DIR = os.path.join(ROOT_DIR, "src/analyze")
 
-# what_subcategory
-# plt.subplot(1, 2, 1)
-freq_what_subcategory = pd.value_counts(flatten_lst(final_df, "what_subcategory"))
-plt.barh(freq_what_subcategory.index, freq_what_subcategory.values)
-plt.title("what subcategory")
-plt.savefig(r"./src/analyze/what_subcategory_distribution.png",
-            dpi=600,
-            format='png',
-            bbox_inches = 'tight',
-            )
-plt.show()
 
-# why_subcategory
-# plt.subplot(1, 2, 2)
-freq_why_subcategory = pd.value_counts(flatten_lst(final_df, "why_subcategory"))
-plt.barh(freq_why_subcategory.index, freq_why_subcategory.values, color = "peru")
-plt.title("why subcategory")
-plt.savefig(r"./src/analyze/why_subcategory_distribution.png",
-            dpi=600,
-            format='png',
-            bbox_inches = 'tight',
-            )
-plt.show()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="aggregate category statistics and draw their distributions")
+    parser.add_argument("files", nargs="*", default=[TRAIN_SET_FILE],
+                        help="labelled sets or classifier output (CSV or JSONL), by default the train set")
+    parser.add_argument("--stats", help="JSON file to save the aggregated statistics to")
+    parser.add_argument("--from-stats", nargs="+", help="merge saved statistics instead of reading files")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chart-dir", default=CHART_DIR)
+    parser.add_argument("--no-charts", action="store_true")
+    args = parser.parse_args()
+
+    if args.from_stats:
+        stats = CategoryStatistics()
+        for path in args.from_stats:
+            stats.merge(CategoryStatistics.load(path))
+    else:
+        # the labelled categories are joined by ";" and their names vary in case and spacing
+        stats = aggregate_files(args.files, args.workers, normalize=True)
+    if args.stats:
+        stats.save(args.stats)
+    print(stats.frequencies("what"))
+    print(stats.frequencies("why"))
+    if not args.no_charts:
+        render_charts(stats, args.chart_dir, show=True)
@@ -0,0 +1,70 @@
+import bisect
+import glob
+import json
+import os
+import random
+import re
+from collections import Counter
+
+import pandas as pd
+
+from project_path import ROOT_DIR
+
+SEED_FILES = sorted(glob.glob(os.path.join(ROOT_DIR, "data/labelled/*.csv")))
+_TOKEN_RE = re.compile(r"\S+|\n")
+
+
+class CorpusDistribution:
+    """
+    Empirical distributions of a set of commit messages: the number of tokens per message and the frequency of every
+    token, where line breaks count as tokens so that multi-line messages and change lists are reproduced too
+    """
+
+    def __init__(self, messages: list[str]):
+        lengths = []
+        vocabulary = Counter()
+        for message in messages:
+            tokens = _TOKEN_RE.findall(message)
+            lengths.append(len(tokens))
+            vocabulary.update(tokens)
+        self.lengths = sorted(lengths)
+        self.tokens = list(vocabulary)
+        self.cum_weights = []
+        total = 0
+        for token in self.tokens:
+            total += vocabulary[token]
+            self.cum_weights.append(total)
+
+    def sample(self, rng: random.Random) -> str:
+        length = self.lengths[rng.randrange(len(self.lengths))]
+        total = self.cum_weights[-1]
+        tokens = [self.tokens[bisect.bisect_right(self.cum_weights, rng.random() * total)] for _ in range(length)]
+        return " ".join(tokens).replace(" \n ", "\n")
+
+
+def load_seed_messages(files: list[str] = None) -> list[str]:
+    files = SEED_FILES if files is None else files
+    messages = []
+    for file in files:
+        messages.extend(pd.read_csv(file)["message"].dropna().astype(str))
+    return messages
+
+
+def generate_corpus(size: int, seed: int = 0, distribution: CorpusDistribution = None):
+    """
+    yield size synthetic commit messages drawn from the distribution of the labelled messages; the same seed always
+    yields the same corpus
+    """
+    distribution = CorpusDistribution(load_seed_messages()) if distribution is None else distribution
+    rng = random.Random(seed)
+    for _ in range(size):
+        yield distribution.sample(rng)
+
+
+def write_corpus(path: str, size: int, seed: int = 0) -> None:
+    """
+    write a synthetic corpus as JSON lines with a "message" field
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for message in generate_corpus(size, seed):
+            f.write(json.dumps({"message": message}) + "\n")
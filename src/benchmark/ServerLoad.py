@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from benchmark.CorpusGenerator import generate_corpus
+
+
+async def run_client(unix_path: str, requests: list[list[str]], latencies: list[float]) -> None:
+    reader, writer = await asyncio.open_unix_connection(unix_path)
+    try:
+        for commit_msgs in requests:
+            start = time.perf_counter()
+            writer.write(json.dumps({"messages": commit_msgs}).encode() + b"\n")
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            if "error" in response:
+                raise RuntimeError(response["error"])
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def fetch_stats(unix_path: str) -> dict:
+    reader, writer = await asyncio.open_unix_connection(unix_path)
+    writer.write(b'{"stats": true}\n')
+    await writer.drain()
+    stats = json.loads(await reader.readline())
+    writer.close()
+    return stats
+
+
+async def run_load(unix_path: str, clients: int = 32, requests: int = 100, messages_per_request: int = 1,
+                   seed: int = 0) -> dict:
+    """
+    send requests requests of messages_per_request synthetic messages from each of clients concurrent connections to
+    a ClassifierServer on unix_path, one request at a time per connection; return the throughput and the latency
+    percentiles seen by the clients together with the server's counters
+    """
+    corpus = generate_corpus(clients * requests * messages_per_request, seed)
+    client_requests = [[[next(corpus) for _ in range(messages_per_request)] for _ in range(requests)]
+                       for _ in range(clients)]
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(unix_path, lst, latencies) for lst in client_requests))
+    elapsed = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1e3
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "messages": len(latencies) * messages_per_request,
+        "seconds": elapsed,
+        "messages_per_second": len(latencies) * messages_per_request / elapsed,
+        "latency_ms": {"p50": float(np.percentile(latencies_ms, 50)), "p99": float(np.percentile(latencies_ms, 99)),
+                       "max": float(latencies_ms.max())},
+        "server": await fetch_stats(unix_path),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="generate load against a ClassifierServer on a Unix socket")
+    parser.add_argument("unix", help="path of the server's Unix socket")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=100, help="requests per client")
+    parser.add_argument("--messages-per-request", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run_load(args.unix, args.clients, args.requests, args.messages_per_request,
+                                          args.seed)), indent=2))
@@ -0,0 +1,130 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+from itertools import islice
+
+from benchmark.CorpusGenerator import CorpusDistribution, generate_corpus, load_seed_messages
+from classfier.CommitClassfier import CommitClassifier, build_results
+from project_path import ROOT_DIR
+from util import CommitUtil
+from util.CommitUtil import denoise, stem_tokenize
+
+STAGES = ["stem_tokenize", "denoise", "match_category", "save_results"]
+DEFAULT_SIZES = [10000, 100000, 1000000, 10000000]
+
+
+def clear_caches() -> None:
+    for cache in (CommitUtil.token_cache, CommitUtil.stem_cache, CommitUtil.lemma_cache):
+        cache.clear()
+
+
+def time_stages(messages: list[str], classifier: CommitClassifier) -> dict:
+    """
+    run the classification stages one after the other over messages, return the seconds spent in each stage
+    """
+    timings = {}
+    start = time.perf_counter()
+    tokenized_msgs = [" ".join(stem_tokenize(message)) for message in messages]
+    timings["stem_tokenize"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    preprocessed_msgs = [denoise(message) for message in tokenized_msgs]
+    timings["denoise"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    categories = [classifier.match_message(message) for message in preprocessed_msgs]
+    timings["match_category"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    build_results(messages, preprocessed_msgs, [why for why, _ in categories], [what for _, what in categories])
+    timings["save_results"] = time.perf_counter() - start
+    return timings
+
+
+def run_benchmark(sizes: list[int] = None, seed: int = 0, batch_size: int = 10000) -> dict:
+    """
+    time every stage over synthetic corpora of the given sizes, generated and processed batch by batch so that memory
+    stays bounded by batch_size. The token caches are cleared before each size
+    """
+    sizes = DEFAULT_SIZES if sizes is None else sizes
+    distribution = CorpusDistribution(load_seed_messages())
+    classifier = CommitClassifier([])
+    classifier.match_message(classifier.preprocess_message("warm up"))
+    runs = []
+    for size in sizes:
+        clear_caches()
+        totals = dict.fromkeys(STAGES, 0.0)
+        corpus = generate_corpus(size, seed, distribution)
+        while True:
+            batch = list(islice(corpus, batch_size))
+            if not batch:
+                break
+            for stage, seconds in time_stages(batch, classifier).items():
+                totals[stage] += seconds
+        for stage in STAGES:
+            runs.append({
+                "size": size,
+                "stage": stage,
+                "seconds": totals[stage],
+                "us_per_message": totals[stage] / size * 1e6,
+                "messages_per_second": size / totals[stage] if totals[stage] else None,
+            })
+        print("size {}: {}".format(size, ", ".join("{} {:.3f}s".format(stage, totals[stage]) for stage in STAGES)))
+    return {
+        "commit": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": seed,
+        "batch_size": batch_size,
+        "cache_stats": CommitUtil.cache_stats(),
+        "runs": runs,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare_reports(baseline: dict, current: dict) -> list[dict]:
+    """
+    return the per-message time ratio current / baseline of every (size, stage) present in both reports
+    """
+    baseline_runs = {(run["size"], run["stage"]): run for run in baseline["runs"]}
+    comparison = []
+    for run in current["runs"]:
+        key = (run["size"], run["stage"])
+        if key in baseline_runs and baseline_runs[key]["us_per_message"]:
+            comparison.append({
+                "size": run["size"],
+                "stage": run["stage"],
+                "baseline_us_per_message": baseline_runs[key]["us_per_message"],
+                "us_per_message": run["us_per_message"],
+                "ratio": run["us_per_message"] / baseline_runs[key]["us_per_message"],
+            })
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time the classification stages over synthetic commit corpora")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--output", default="benchmark.json", help="JSON report to write")
+    parser.add_argument("--baseline", help="JSON report of an earlier commit to compare against")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.sizes, args.seed, args.batch_size)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            for row in compare_reports(json.load(f), report):
+                print("size {size} {stage}: {baseline_us_per_message:.1f}us -> {us_per_message:.1f}us "
+                      "({ratio:.2f}x)".format(**row))
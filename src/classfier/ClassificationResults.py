@@ -0,0 +1,305 @@
+import numpy as np
+import pandas as pd
+
+from classfier.CommitClassfier import WhatCategory, WhyCategory
+from util.ColumnarStore import decode_strings, encode_strings
+
+CATEGORY_FACTORIES = {"why": WhyCategory, "what": WhatCategory}
+
+
+def mask_dtype(category_factory) -> np.dtype:
+    """
+    return the smallest unsigned integer type with one bit for every member of category_factory
+    """
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if len(category_factory) <= np.iinfo(dtype).bits:
+            return np.dtype(dtype)
+    raise ValueError("{} has too many members for a bitmask".format(category_factory.__name__))
+
+
+def category_positions(category_factory) -> dict:
+    """
+    return the bit position of every category of category_factory by its name
+    """
+    return {category.name: position for position, category in enumerate(category_factory)}
+
+
+def names_to_masks(names, category_factory) -> np.ndarray:
+    """
+    return the bitmasks of a sequence of category names (one category per message)
+    """
+    codes, uniques = pd.factorize(pd.Series(names, dtype=object))
+    positions = category_positions(category_factory)
+    unknown = set(uniques) - set(positions)
+    if unknown:
+        raise ValueError("unknown {} names: {}".format(category_factory.__name__, sorted(map(str, unknown))))
+    dtype = mask_dtype(category_factory)
+    unique_masks = np.array([1 << positions[name] for name in uniques], dtype=dtype)
+    return unique_masks[codes] if len(codes) else np.zeros(0, dtype=dtype)
+
+
+def lists_to_masks(category_lists, category_factory) -> np.ndarray:
+    """
+    return the bitmasks of a sequence of category name lists (any number of categories per message)
+    """
+    exploded = pd.Series(list(category_lists), dtype=object).explode().dropna()
+    masks = np.zeros(len(category_lists), dtype=mask_dtype(category_factory))
+    if len(exploded):
+        positions = category_positions(category_factory)
+        unknown = set(exploded) - set(positions)
+        if unknown:
+            raise ValueError("unknown {} names: {}".format(category_factory.__name__, sorted(map(str, unknown))))
+        bits = exploded.map(positions).to_numpy(dtype=np.int64)
+        np.bitwise_or.at(masks, exploded.index.to_numpy(), np.left_shift(1, bits).astype(masks.dtype))
+    return masks
+
+
+def primary_ids(masks: np.ndarray, category_factory) -> np.ndarray:
+    """
+    return the position of one category per message with the "last match wins" rule of the classifier: the highest
+    set bit except MISSING's, or MISSING if no other bit is set
+    """
+    missing = list(category_factory).index(category_factory.MISSING)
+    ids = np.full(len(masks), missing, dtype=np.int8)
+    for position in range(len(category_factory)):
+        if position != missing:
+            ids[(masks >> position) & 1 == 1] = position
+    return ids
+
+
+class TextColumn:
+    """
+    Texts stored once: the distinct values in a UTF-8 byte arena and the code of the value of every row. Missing
+    values (None or NaN) are stored as a distinct value marked in nulls and read back as None
+    """
+    __slots__ = ("codes", "data", "offsets", "nulls")
+
+    def __init__(self, codes: np.ndarray, data: np.ndarray, offsets: np.ndarray, nulls: np.ndarray = None):
+        self.codes = codes
+        self.data = data
+        self.offsets = offsets
+        self.nulls = np.zeros(len(offsets) - 1, dtype=bool) if nulls is None else nulls
+
+    @classmethod
+    def from_values(cls, values) -> "TextColumn":
+        # missing values get a code of their own rather than the -1 sentinel, which would index the last value
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+        data, offsets, nulls = encode_strings(uniques)
+        return cls(codes.astype(np.int32), data, offsets, nulls)
+
+    @classmethod
+    def concat(cls, columns: list) -> "TextColumn":
+        """
+        join the arenas of several columns without decoding them; a text repeated across columns is kept once per
+        column
+        """
+        n_values = np.cumsum([0] + [len(column.offsets) - 1 for column in columns])
+        n_bytes = np.cumsum([0] + [len(column.data) for column in columns])
+        return cls(
+            np.concatenate([column.codes + shift for column, shift in zip(columns, n_values)]).astype(np.int32),
+            np.concatenate([column.data for column in columns]),
+            np.concatenate([columns[0].offsets[:1]] + [column.offsets[1:] + shift
+                                                       for column, shift in zip(columns, n_bytes)]),
+            np.concatenate([column.nulls for column in columns]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, position: int) -> str:
+        code = int(self.codes[position])
+        return decode_strings(self.data, self.offsets, self.nulls, start=code, stop=code + 1)[0]
+
+    def tolist(self) -> list:
+        return np.array(decode_strings(self.data, self.offsets, self.nulls), dtype=object)[self.codes].tolist()
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.data.nbytes + self.offsets.nbytes + self.nulls.nbytes
+
+
+class ResultRecord:
+    """
+    Read-only view of one message of a ClassificationResults
+    """
+    __slots__ = ("results", "position")
+
+    def __init__(self, results: "ClassificationResults", position: int):
+        self.results = results
+        self.position = position
+
+    @property
+    def message(self) -> str:
+        return None if self.results.messages is None else self.results.messages[self.position]
+
+    @property
+    def preprocessed(self) -> str:
+        return None if self.results.preprocessed is None else self.results.preprocessed[self.position]
+
+    @property
+    def why(self) -> WhyCategory:
+        return list(WhyCategory)[self.results.why_ids()[self.position]]
+
+    @property
+    def what(self) -> WhatCategory:
+        return list(WhatCategory)[self.results.what_ids()[self.position]]
+
+    @property
+    def why_categories(self) -> list:
+        return self.results.categories("why", self.position)
+
+    @property
+    def what_categories(self) -> list:
+        return self.results.categories("what", self.position)
+
+    @property
+    def good_classified(self) -> bool:
+        return bool(self.results.good_classified()[self.position])
+
+    def __repr__(self):
+        return "ResultRecord(why={}, what={}, message={!r})".format(self.why, self.what, self.message)
+
+
+class ClassificationResults:
+    """
+    Compact classification results: the why and what categories of every message as bitmasks over the members of
+    WhyCategory and WhatCategory (one bit per matched category, so multi-label results fit as well), and optionally
+    the raw and preprocessed texts as TextColumns. A message takes a few bytes instead of the Python lists and strings
+    of a get_results() DataFrame; records, category names and pandas Categoricals are produced on demand
+    """
+
+    def __init__(self, why_masks: np.ndarray, what_masks: np.ndarray, messages: TextColumn = None,
+                 preprocessed: TextColumn = None):
+        if len(why_masks) != len(what_masks):
+            raise ValueError("why and what masks differ in length: {} != {}".format(len(why_masks), len(what_masks)))
+        self.why_masks = why_masks
+        self.what_masks = what_masks
+        self.messages = messages
+        self.preprocessed = preprocessed
+        self._derived = {}
+
+    @classmethod
+    def from_names(cls, why_names, what_names, messages=None, preprocessed=None) -> "ClassificationResults":
+        """
+        build the results from one why and one what category name per message, e.g. CategoryMatcher.match_series
+        """
+        return cls(names_to_masks(why_names, WhyCategory), names_to_masks(what_names, WhatCategory),
+                   None if messages is None else TextColumn.from_values(messages),
+                   None if preprocessed is None else TextColumn.from_values(preprocessed))
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, keep_text: bool = True) -> "ClassificationResults":
+        """
+        build the results from a DataFrame in the format of CommitClassifier.get_results()
+        """
+        return cls(lists_to_masks(df["why_subcategory"], WhyCategory),
+                   lists_to_masks(df["what_subcategory"], WhatCategory),
+                   TextColumn.from_values(df["message"]) if keep_text else None,
+                   TextColumn.from_values(df["preprocessed"]) if keep_text else None)
+
+    @classmethod
+    def concat(cls, results: list) -> "ClassificationResults":
+        if not results:
+            return cls(np.zeros(0, mask_dtype(WhyCategory)), np.zeros(0, mask_dtype(WhatCategory)))
+        keep_text = all(result.messages is not None for result in results)
+        return cls(
+            np.concatenate([result.why_masks for result in results]),
+            np.concatenate([result.what_masks for result in results]),
+            TextColumn.concat([result.messages for result in results]) if keep_text else None,
+            TextColumn.concat([result.preprocessed for result in results]) if keep_text else None,
+        )
+
+    def __len__(self) -> int:
+        return len(self.why_masks)
+
+    def __getitem__(self, position: int) -> ResultRecord:
+        if not -len(self) <= position < len(self):
+            raise IndexError("result index out of range")
+        return ResultRecord(self, position % len(self))
+
+    def __iter__(self):
+        return (ResultRecord(self, position) for position in range(len(self)))
+
+    def masks(self, dimension: str) -> np.ndarray:
+        return self.why_masks if dimension == "why" else self.what_masks
+
+    def ids(self, dimension: str) -> np.ndarray:
+        """
+        return the position in its enum of the single category of every message for dimension "why" or "what"
+        """
+        if dimension not in self._derived:
+            self._derived[dimension] = primary_ids(self.masks(dimension), CATEGORY_FACTORIES[dimension])
+        return self._derived[dimension]
+
+    def why_ids(self) -> np.ndarray:
+        return self.ids("why")
+
+    def what_ids(self) -> np.ndarray:
+        return self.ids("what")
+
+    def categories(self, dimension: str, position: int) -> list:
+        """
+        return every category set in the mask of one message, in enum order
+        """
+        mask = int(self.masks(dimension)[position])
+        return [category for bit, category in enumerate(CATEGORY_FACTORIES[dimension]) if mask >> bit & 1]
+
+    def categorical(self, dimension: str) -> pd.Categorical:
+        """
+        return the single category names of dimension "why" or "what" as a pandas Categorical
+        """
+        return pd.Categorical.from_codes(self.ids(dimension),
+                                         categories=[category.name for category in CATEGORY_FACTORIES[dimension]])
+
+    def good_classified(self) -> np.ndarray:
+        """
+        return whether every message has at least one category of both dimensions and none of them is MISSING, as
+        is_good_classified does for the category lists
+        """
+        if "good" not in self._derived:
+            good = np.ones(len(self), dtype=bool)
+            for dimension, category_factory in CATEGORY_FACTORIES.items():
+                missing_bit = 1 << list(category_factory).index(category_factory.MISSING)
+                masks = self.masks(dimension)
+                good &= (masks != 0) & (masks & missing_bit == 0)
+            self._derived["good"] = good
+        return self._derived["good"]
+
+    def category_lists(self, dimension: str) -> list:
+        """
+        return the category name lists of dimension "why" or "what", as in get_results()
+        """
+        unique_masks, codes = np.unique(self.masks(dimension), return_inverse=True)
+        members = list(CATEGORY_FACTORIES[dimension])
+        lists = [[members[bit].name for bit in range(len(members)) if int(mask) >> bit & 1] for mask in unique_masks]
+        return [list(lists[code]) for code in codes.ravel()]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        return the results in the format of CommitClassifier.get_results(); the text columns are None if they were
+        not kept
+        """
+        return pd.DataFrame({
+            "message": self.messages.tolist() if self.messages is not None else [None] * len(self),
+            "preprocessed": self.preprocessed.tolist() if self.preprocessed is not None else [None] * len(self),
+            "why_subcategory": self.category_lists("why"),
+            "what_subcategory": self.category_lists("what"),
+            "good_classified": self.good_classified(),
+        })
+
+    @property
+    def nbytes(self) -> int:
+        return self.why_masks.nbytes + self.what_masks.nbytes + sum(
+            column.nbytes for column in (self.messages, self.preprocessed) if column is not None)
+
+
+def classify_compact(classifier, commit_msgs, batch_size: int = 10000, executor=None,
+                     keep_text: bool = False) -> ClassificationResults:
+    """
+    classify commit messages from any iterable with classifier.classify_iter and keep only the compact results of
+    each batch, with the texts if keep_text is set
+    """
+    return ClassificationResults.concat([
+        ClassificationResults.from_dataframe(df, keep_text)
+        for df in classifier.classify_iter(commit_msgs, batch_size, executor)
+    ])
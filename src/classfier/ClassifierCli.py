@@ -0,0 +1,200 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import warnings
+from typing import Iterator, TextIO
+
+import pandas as pd
+
+from classfier.CommitClassfier import CommitClassifier, build_results, create_classifier_pool, open_result_cache
+from classfier.PatternBundle import load_pattern_bundle
+from util.CommitUtil import cache_stats, ensure_nltk_resources
+
+INPUT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".json": "jsonl", ".txt": "text"}
+OUTPUT_FORMATS = ["jsonl", "csv"]
+RESULT_COLUMNS = ["message", "preprocessed", "why_subcategory", "what_subcategory", "good_classified"]
+CATEGORY_SEPARATOR = "; "
+
+
+def input_format_of(file_name: str, input_format: str = None) -> str:
+    if input_format is not None:
+        return input_format
+    return INPUT_FORMATS.get(os.path.splitext(file_name)[1].lower(), "text")
+
+
+def read_batches(f: TextIO, input_format: str, column: str, batch_size: int) -> Iterator[pd.DataFrame]:
+    """
+    read the records of f batch by batch as DataFrames with the messages in column. A text file holds one message per
+    line, a JSONL file one object per line and a CSV file a header row
+    """
+    if input_format == "csv":
+        for batch in pd.read_csv(f, chunksize=batch_size, dtype=str, keep_default_na=False):
+            if column not in batch.columns:
+                raise ValueError("no column '{}' in the CSV input, use --column".format(column))
+            yield batch
+        return
+    records = []
+    for line in f:
+        if input_format == "text":
+            records.append({column: line.rstrip("\r\n")})
+        elif line.strip():
+            record = json.loads(line)
+            record[column] = "" if record.get(column) is None else str(record[column])
+            records.append(record)
+        if len(records) == batch_size:
+            yield pd.DataFrame(records, dtype=object)
+            records = []
+    if records:
+        yield pd.DataFrame(records, dtype=object)
+
+
+class RecordWriter:
+    """
+    Write classified records to a stream as JSONL or CSV (category lists joined with "; "), flushing after every batch.
+    JSONL records keep only their own fields. The CSV columns are those of the first batch: fields a record lacks are
+    written empty, and fields that only later batches have are dropped with a warning
+    """
+
+    def __init__(self, f: TextIO, output_format: str):
+        self.f = f
+        self.output_format = output_format
+        self.csv_writer = None
+        self.dropped_columns = set()
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.output_format == "jsonl":
+            for record in df.to_dict(orient="records"):
+                # fields other records of the batch have are missing (NaN) in this one
+                record = {key: value for key, value in record.items()
+                          if not (isinstance(value, float) and value != value)}
+                self.f.write(json.dumps(record, ensure_ascii=False, default=str))
+                self.f.write("\n")
+        else:
+            df = df.astype(object).where(df.notna(), "")
+            for col in ("why_subcategory", "what_subcategory"):
+                df[col] = df[col].map(CATEGORY_SEPARATOR.join)
+            if self.csv_writer is None:
+                self.csv_writer = csv.DictWriter(self.f, fieldnames=list(df.columns), restval="",
+                                                 extrasaction="ignore")
+                self.csv_writer.writeheader()
+            new_columns = set(df.columns) - set(self.csv_writer.fieldnames) - self.dropped_columns
+            if new_columns:
+                self.dropped_columns |= new_columns
+                warnings.warn("dropping fields missing from the first batch in the CSV output: {}".format(
+                    ", ".join(sorted(map(str, new_columns)))))
+            self.csv_writer.writerows(df.to_dict(orient="records"))
+        self.f.flush()
+
+
+def classify_batch(classifier: CommitClassifier, batch: pd.DataFrame, column: str, executor=None) -> pd.DataFrame:
+    """
+    classify the messages in column of batch and return the results of get_results() followed by the other input
+    columns
+    """
+    commit_msgs = batch[column].tolist()
+    preprocessed_msgs, why_subcategory, what_subcategory = (
+        list(col) for col in zip(*classifier.classify_unique(commit_msgs, executor)))
+    results = build_results(commit_msgs, preprocessed_msgs, why_subcategory, what_subcategory)
+    extra = batch.drop(columns=[column]).drop(columns=RESULT_COLUMNS, errors="ignore").reset_index(drop=True)
+    return pd.concat([results, extra], axis=1)
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="commit-classify",
+        description="classify commit messages read from files or stdin into why and what categories",
+    )
+    parser.add_argument("files", nargs="*", default=["-"], help="input files, - or none for stdin")
+    parser.add_argument("-i", "--input-format", choices=["csv", "jsonl", "text"],
+                        help="input format, by default from the file extension (text for stdin)")
+    parser.add_argument("-c", "--column", default="message", help="field or column holding the message")
+    parser.add_argument("-o", "--output", default="-", help="output file, - for stdout")
+    parser.add_argument("-f", "--output-format", choices=OUTPUT_FORMATS, default="jsonl",
+                        help="CSV output has the columns of the first batch, later new fields are dropped")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("-b", "--batch-size", type=int, default=10000, help="messages read and written at a time")
+    parser.add_argument("--chunk-size", type=int, default=500, help="messages per task sent to a worker")
+    parser.add_argument("--cache", help="SQLite result cache to reuse the results of earlier runs")
+    parser.add_argument("--pattern-bundle", help="pattern bundle to start from, built again if out of date")
+    parser.add_argument("--download-nltk", action="store_true",
+                        help="download the NLTK data the preprocessing needs if it is not installed")
+    parser.add_argument("--stats", action="store_true",
+                        help="print throughput, per stage time and cache counters to stderr; with workers > 1 the "
+                             "token caches of the worker processes are not collected, only the parent's are shown")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> int:
+    args = parse_args(argv)
+    try:
+        ensure_nltk_resources(download=args.download_nltk)
+    except LookupError as e:
+        print("{}, or pass --download-nltk".format(e), file=sys.stderr)
+        return 2
+    if args.pattern_bundle:
+        load_pattern_bundle(args.pattern_bundle)
+    cache = open_result_cache(args.cache) if args.cache else None
+    classifier = CommitClassifier([], workers=args.workers, chunk_size=args.chunk_size, cache=cache)
+    pool = create_classifier_pool(args.workers, bundle_path=args.pattern_bundle) if args.workers > 1 else None
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    writer = RecordWriter(out, args.output_format)
+    timings = {"read": 0.0, "classify": 0.0, "write": 0.0}
+    n_msgs = 0
+    start = time.perf_counter()
+    try:
+        for file_name in args.files:
+            input_format = "text" if file_name == "-" and args.input_format is None else input_format_of(
+                file_name, args.input_format)
+            f = sys.stdin if file_name == "-" else open(file_name, newline="" if input_format == "csv" else None,
+                                                        encoding="utf-8")
+            try:
+                batches = read_batches(f, input_format, args.column, args.batch_size)
+                while True:
+                    stage_start = time.perf_counter()
+                    batch = next(batches, None)
+                    timings["read"] += time.perf_counter() - stage_start
+                    if batch is None:
+                        break
+                    stage_start = time.perf_counter()
+                    results = classify_batch(classifier, batch, args.column, pool)
+                    timings["classify"] += time.perf_counter() - stage_start
+                    stage_start = time.perf_counter()
+                    writer.write(results)
+                    timings["write"] += time.perf_counter() - stage_start
+                    n_msgs += len(results)
+            finally:
+                if f is not sys.stdin:
+                    f.close()
+    except BrokenPipeError:
+        # the reader of stdout went away, e.g. piped into head: point stdout at devnull so that the interpreter does
+        # not fail again flushing it at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if pool is not None:
+            pool.shutdown()
+        if cache is not None:
+            cache.close()
+    if args.stats:
+        elapsed = time.perf_counter() - start
+        stats = {
+            "messages": n_msgs,
+            "seconds": elapsed,
+            "messages_per_second": n_msgs / elapsed if elapsed else None,
+            "stage_seconds": timings,
+        }
+        # the messages are tokenized in the workers when there is a pool, whose caches the parent cannot see
+        stats["parent_token_caches" if pool is not None else "token_caches"] = cache_stats()
+        if cache is not None:
+            stats["result_cache"] = {"hits": cache.hits, "misses": cache.misses}
+        print(json.dumps(stats, indent=2), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from classfier.CommitClassfier import CommitClassifier, build_results, create_classifier_pool, \
+    init_classifier_worker, open_result_cache
+from util.CommitUtil import ensure_nltk_resources
+
+RESULT_FIELDS = ["preprocessed", "why_subcategory", "what_subcategory", "good_classified"]
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                500: "Internal Server Error"}
+
+
+class ServerStats:
+    """
+    Request, message and batch counters, the number of failed requests and the latencies of the last window
+    requests
+    """
+
+    def __init__(self, window: int = 10000):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.messages = 0
+        self.batches = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=window)
+
+    def record_request(self, n_msgs: int, seconds: float) -> None:
+        self.requests += 1
+        self.messages += n_msgs
+        self.latencies.append(seconds)
+
+    def report(self, queue_size: int = 0) -> dict:
+        uptime = time.perf_counter() - self.started
+        latencies = np.array(self.latencies) * 1e3
+        return {
+            "uptime_seconds": uptime,
+            "requests": self.requests,
+            "messages": self.messages,
+            "batches": self.batches,
+            "errors": self.errors,
+            "mean_batch_size": self.messages / self.batches if self.batches else None,
+            "messages_per_second": self.messages / uptime if uptime else None,
+            "queue_size": queue_size,
+            "latency_ms": {
+                "p50": float(np.percentile(latencies, 50)) if len(latencies) else None,
+                "p99": float(np.percentile(latencies, 99)) if len(latencies) else None,
+                "max": float(latencies.max()) if len(latencies) else None,
+            },
+        }
+
+
+class MicroBatcher:
+    """
+    Gather the messages of concurrent requests into batches of at most max_batch_size messages, waiting at most
+    max_latency seconds after the first message of a batch for more to arrive. Batches are classified one at a time
+    on a dispatcher thread (in the process pool if workers > 1), so the event loop stays free to accept requests while
+    the next batch fills up. The queue holds at most max_queue messages: once it is full, submit waits, the connection
+    handlers stop reading and the clients are slowed down by the socket buffers filling up
+    """
+
+    def __init__(self, workers: int = 1, max_batch_size: int = 256, max_latency: float = 0.005,
+                 max_queue: int = 10000, cache_path: str = None, bundle_path: str = None):
+        self.workers = workers
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.cache_path = cache_path
+        self.bundle_path = bundle_path
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.stats = ServerStats()
+        self.classifier = None
+        self.pool = None
+        self.task = None
+        # the result cache is a SQLite connection, which must be used on the thread that opened it
+        self.dispatcher = ThreadPoolExecutor(max_workers=1, initializer=self.init_dispatcher)
+
+    def init_dispatcher(self) -> None:
+        cache = open_result_cache(self.cache_path) if self.cache_path else None
+        self.classifier = CommitClassifier([], workers=self.workers, cache=cache)
+        if self.workers > 1:
+            self.pool = create_classifier_pool(self.workers, bundle_path=self.bundle_path)
+        else:
+            init_classifier_worker(bundle_path=self.bundle_path)
+
+    def classify_batch(self, commit_msgs: list[str]) -> list[dict]:
+        preprocessed_msgs, why_subcategory, what_subcategory = (
+            list(column) for column in zip(*self.classifier.classify_unique(commit_msgs, self.pool)))
+        results = build_results(commit_msgs, preprocessed_msgs, why_subcategory, what_subcategory)
+        return results[RESULT_FIELDS].to_dict(orient="records")
+
+    async def start(self) -> None:
+        # warm up the dispatcher thread (and the pool) before the first request
+        await asyncio.get_running_loop().run_in_executor(self.dispatcher, self.classify_batch, ["warm up"])
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+        # closed on the dispatcher thread, which owns the cache connection, without blocking the event loop
+        await asyncio.get_running_loop().run_in_executor(self.dispatcher, self.close_dispatcher)
+        self.dispatcher.shutdown(wait=False)
+
+    def close_dispatcher(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
+        if self.classifier is not None and self.classifier.cache is not None:
+            self.classifier.cache.close()
+
+    async def submit(self, commit_msgs: list[str]) -> list[dict]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for commit_msg in commit_msgs:
+            future = loop.create_future()
+            await self.queue.put((commit_msg, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            commit_msgs = [commit_msg for commit_msg, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.dispatcher, self.classify_batch, commit_msgs)
+            except Exception as e:
+                # counted once per failed request by the connection handlers
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.stats.batches += 1
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class ClassifierServer:
+    """
+    Serve a MicroBatcher over a Unix socket speaking JSON lines, or over HTTP. A JSON lines request is
+    {"messages": [...]} (or {"message": "..."}) and is answered with {"results": [...]}, one result per message with
+    the preprocessed message, the why/what categories and good_classified; {"stats": true} is answered with the
+    counters and latency percentiles. Over HTTP the same request bodies are POSTed to /classify and the counters are
+    served at GET /stats
+    """
+
+    def __init__(self, batcher: MicroBatcher):
+        self.batcher = batcher
+
+    async def handle(self, request: dict) -> dict:
+        if request.get("stats"):
+            return self.batcher.stats.report(self.batcher.queue.qsize())
+        commit_msgs = request["messages"] if "messages" in request else [request["message"]]
+        if not isinstance(commit_msgs, list) or not all(isinstance(commit_msg, str) for commit_msg in commit_msgs):
+            raise ValueError("messages must be a list of strings")
+        start = time.perf_counter()
+        results = await self.batcher.submit(commit_msgs)
+        self.batcher.stats.record_request(len(commit_msgs), time.perf_counter() - start)
+        return {"results": results}
+
+    async def handle_json_lines(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    response = await self.handle(json.loads(line))
+                except Exception as e:
+                    # a failed request, e.g. a classification error, is answered without dropping the connection
+                    self.batcher.stats.errors += 1
+                    response = {"error": "{}: {}".format(type(e).__name__, e)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if not header.strip():
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status = 200
+                if path == "/stats" and method == "GET":
+                    response = await self.handle({"stats": True})
+                elif path == "/classify" and method == "POST":
+                    try:
+                        response = await self.handle(json.loads(body))
+                    except (ValueError, KeyError, TypeError) as e:
+                        self.batcher.stats.errors += 1
+                        status, response = 400, {"error": "{}: {}".format(type(e).__name__, e)}
+                    except Exception as e:
+                        self.batcher.stats.errors += 1
+                        status, response = 500, {"error": "{}: {}".format(type(e).__name__, e)}
+                else:
+                    status = 404 if path not in ("/stats", "/classify") else 405
+                    response = {"error": HTTP_REASONS[status]}
+                payload = json.dumps(response).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                             "Connection: {}\r\n\r\n".format(status, HTTP_REASONS[status], len(payload),
+                                                             "keep-alive" if keep_alive else "close").encode())
+                writer.write(payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, unix_path: str = None, host: str = None, port: int = None,
+                    ready: asyncio.Event = None) -> None:
+        """
+        serve on unix_path, or over HTTP on host:port, until cancelled
+        """
+        await self.batcher.start()
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle_json_lines, path=unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_http, host, port)
+        try:
+            async with server:
+                if ready is not None:
+                    ready.set()
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="serve the commit classifier over a Unix socket or HTTP")
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument("--unix", help="path of the Unix socket to serve JSON lines on")
+    address.add_argument("--http", help="host:port to serve HTTP on")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--max-latency-ms", type=float, default=5.0,
+                        help="longest wait for more messages after the first one of a batch")
+    parser.add_argument("--max-queue", type=int, default=10000, help="queued messages before requests are held back")
+    parser.add_argument("--cache", help="SQLite result cache")
+    parser.add_argument("--pattern-bundle", help="pattern bundle to start from, built again if out of date")
+    args = parser.parse_args()
+
+    ensure_nltk_resources(download=True)
+
+    async def main():
+        batcher = MicroBatcher(args.workers, args.max_batch_size, args.max_latency_ms / 1e3, args.max_queue, args.cache,
+                               args.pattern_bundle)
+        server = ClassifierServer(batcher)
+        if args.unix:
+            await server.serve(unix_path=args.unix)
+        else:
+            host, _, port = args.http.rpartition(":")
+            await server.serve(host=host or "127.0.0.1", port=int(port))
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
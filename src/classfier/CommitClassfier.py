@@ -1,12 +1,29 @@
+import hashlib
+import os
+import re
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
+from itertools import islice
+from typing import Iterable, Iterator
+import warnings
+
+import numpy as np
 import pandas as pd
 
-from project_path import ROOT_DIR
+from classfier.PatternProfiler import PatternProfiler
+from classfier.ResultCache import ResultCache
 from util.CommitUtil import *
-from util.FileUtil import getKeywordFromFile
+from util.FileUtil import getKeywordListFromFile
+from util.KeywordAutomaton import KeywordAutomaton
+
+# bump whenever preprocessing or matching changes in a way the patterns do not show, to invalidate cached results
+PREPROCESSING_VERSION = 1
 
-PATTERN_DIR = "{}/data/pattern/".format(ROOT_DIR)
+# the root of the checkout the package runs from. An installed package carries the pattern files itself (see setup.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PACKAGED_PATTERN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pattern/")
+PATTERN_DIR = PACKAGED_PATTERN_DIR if os.path.isdir(PACKAGED_PATTERN_DIR) else "{}/data/pattern/".format(ROOT_DIR)
 TO_FIX_DEFECTS_KEYWORD_FILE = PATTERN_DIR + "to_fix_defects_keyword.txt"
 LINK_ISSUE_VERB_KEYWORD_FILE = PATTERN_DIR + "link_issue_verb_keyword.txt"
 OUT_OF_DATE_KEYWORD_FILE = PATTERN_DIR + "out_of_date_keyword.txt"
@@ -24,180 +41,595 @@ UNDESIRED_BEHAVIOR_KEYWORD_FILE = PATTERN_DIR + "undesired_behavior_keyword.txt"
 PREDEFINED_PROGRAMMING_KEYWORD = PATTERN_DIR + "predefined_programming_keyword.txt"
 NEGATION_KEYWORD = PATTERN_DIR + "negation.txt"
 
-fix_defects_keyword_list = getKeywordFromFile(TO_FIX_DEFECTS_KEYWORD_FILE)
-test_verb_keyword_lst = getKeywordFromFile(TEST_VERB_KEYWORD_FILE)
-annotation_noun_keyword_lst = getKeywordFromFile(ANNOTATION_NOUN_KEYWORD_FILE)
-editing_verb_keyword_lst = getKeywordFromFile(EDITING_VERB_KEYWORD_FILE)
-text_file_noun_keyword_lst = getKeywordFromFile(TEXT_FILE_NOUN_KEYWORD_FILE)
-ordering_symbol_lst = getKeywordFromFile(ORDERING_SYMBOL_FILE)
 
+class Keywords(namedtuple("Keywords", "file")):
+    """
+    Placeholder in the pattern of a category for the keywords of a file in data/pattern, joined by "|". The file is
+    only read when the pattern is first used
+    """
+
+
+_keywords = {}
+_regex_exps = {}
+
+
+def load_keyword_list(file_path: str) -> list[str]:
+    """
+    return the keywords of file_path, reading each file once
+    """
+    if file_path not in _keywords:
+        _keywords[file_path] = getKeywordListFromFile(file_path)
+    return _keywords[file_path]
+
+
+def load_keywords(file_path: str) -> str:
+    """
+    return the "|"-joined keywords of file_path
+    """
+    return "|".join(load_keyword_list(file_path))
+
+
+def get_regex_exp(category) -> str:
+    """
+    return the regular expression of a category, filling the keywords into its template on first use
+    """
+    if category not in _regex_exps:
+        _regex_exps[category] = category.template.format(
+            *(load_keywords(source.file) if isinstance(source, Keywords) else source for source in category.sources)
+        )
+    return _regex_exps[category]
+
+
+# "|"-joined keywords once read into module globals at import, still available under their old names but read lazily
+_KEYWORD_GLOBALS = {
+    "fix_defects_keyword_list": TO_FIX_DEFECTS_KEYWORD_FILE,
+    "test_verb_keyword_lst": TEST_VERB_KEYWORD_FILE,
+    "annotation_noun_keyword_lst": ANNOTATION_NOUN_KEYWORD_FILE,
+    "editing_verb_keyword_lst": EDITING_VERB_KEYWORD_FILE,
+    "text_file_noun_keyword_lst": TEXT_FILE_NOUN_KEYWORD_FILE,
+    "ordering_symbol_lst": ORDERING_SYMBOL_FILE,
+}
+
+
+def __getattr__(name: str):
+    if name in _KEYWORD_GLOBALS:
+        return load_keywords(_KEYWORD_GLOBALS[name])
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
-class WhyCategory(namedtuple("CommitCategory", "name regex_exp"), Enum):
+
+class WhyCategory(namedtuple("CommitCategory", "name template sources"), Enum):
     """
     Enum class for each category, in which name attribute (the first one) is the unique name for the category. And the
-    regex_exp is the regular expression of the pattern for the category
+    regex_exp is the regular expression of the pattern for the category, built from the template and its sources
     """
 
     # why_subcategories
-    MISSING = "Missing Why", ""
-    DESCRIBE_ERROR_SCENARIO = "Describe error scenario", ".*error.*"
+    MISSING = "Missing Why", "", ()
+    DESCRIBE_ERROR_SCENARIO = "Describe error scenario", ".*error.*", ()
 
     INTRODUCE_ISSUE_PR_REFERENCE = (
         "Introduce issue/PR reference",
-        "(?P<link_issue_verb>{})?\W.*?(issue|review)?\W.*?(?P<issue_link>\#\d+)+".format(
-            getKeywordFromFile(LINK_ISSUE_VERB_KEYWORD_FILE)
-        ),
+        "(?P<link_issue_verb>{})?\W.*?(issue|review)?\W.*?(?P<issue_link>\#\d+)+",
+        (Keywords(LINK_ISSUE_VERB_KEYWORD_FILE),),
     )
 
-    OUT_OF_DATE = "Out of date", "({})+\W".format(
-        getKeywordFromFile(OUT_OF_DATE_KEYWORD_FILE)
-    )
+    OUT_OF_DATE = "Out of date", "({})+\W", (Keywords(OUT_OF_DATE_KEYWORD_FILE),)
 
-    TO_FIX_DEFECTS = "To fix defects", "({})+".format(fix_defects_keyword_list)
+    TO_FIX_DEFECTS = "To fix defects", "({})+", (Keywords(TO_FIX_DEFECTS_KEYWORD_FILE),)
 
-    CONVENTIONS_AND_STANDARDS = "Conventions and standards", "({})*({})+({})*".format(
-        getKeywordFromFile(CONFORMITY_MODAL),
-        getKeywordFromFile(CONVENTIONS_AND_STANDARDS_KEYWORD_FILE),
-        getKeywordFromFile(CONFORMITY_MODAL),
+    CONVENTIONS_AND_STANDARDS = (
+        "Conventions and standards",
+        "({})*({})+({})*",
+        (
+            Keywords(CONFORMITY_MODAL),
+            Keywords(CONVENTIONS_AND_STANDARDS_KEYWORD_FILE),
+            Keywords(CONFORMITY_MODAL),
+        ),
     )
 
     TEST_CASES = (
         "Test cases",
-        "((\S*?test)+\W.*?({})+\W)|(({})+\W.*?(\S*?test)+\W)".format(
-            test_verb_keyword_lst, test_verb_keyword_lst
-        ),
+        "((\S*?test)+\W.*?({})+\W)|(({})+\W.*?(\S*?test)+\W)",
+        (Keywords(TEST_VERB_KEYWORD_FILE), Keywords(TEST_VERB_KEYWORD_FILE)),
     )
 
-    TYPOGRAPHIC_FIXES = "Typographic fixes", "(typo|typographic|typograph)+"
+    TYPOGRAPHIC_FIXES = "Typographic fixes", "(typo|typographic|typograph)+", ()
 
     TEXT_FILE_CHANGES = (
         "Text file changes",
-        "(({})+\W.*?({})+\W)|(({})+\W.*?({})+\W)".format(
-            text_file_noun_keyword_lst,
-            editing_verb_keyword_lst,
-            editing_verb_keyword_lst,
-            text_file_noun_keyword_lst,
+        "(({})+\W.*?({})+\W)|(({})+\W.*?({})+\W)",
+        (
+            Keywords(TEXT_FILE_NOUN_KEYWORD_FILE),
+            Keywords(EDITING_VERB_KEYWORD_FILE),
+            Keywords(EDITING_VERB_KEYWORD_FILE),
+            Keywords(TEXT_FILE_NOUN_KEYWORD_FILE),
         ),
     )
 
     ANNOTATION_CHANGES = (
         "Annotation changes",
-        "(({})+\W.*?({})+\W)|(({})+\W.*?({})+\W)".format(
-            annotation_noun_keyword_lst,
-            editing_verb_keyword_lst,
-            editing_verb_keyword_lst,
-            annotation_noun_keyword_lst,
+        "(({})+\W.*?({})+\W)|(({})+\W.*?({})+\W)",
+        (
+            Keywords(ANNOTATION_NOUN_KEYWORD_FILE),
+            Keywords(EDITING_VERB_KEYWORD_FILE),
+            Keywords(EDITING_VERB_KEYWORD_FILE),
+            Keywords(ANNOTATION_NOUN_KEYWORD_FILE),
         ),
     )
 
+    @property
+    def regex_exp(self) -> str:
+        return get_regex_exp(self)
+
     def __str__(self) -> str:
         return self.name
 
 
-class WhatCategory(namedtuple("CommitCategory", "name regex_exp"), Enum):
+class WhatCategory(namedtuple("CommitCategory", "name template sources"), Enum):
     """
     Enum class for each category, in which name attribute (the first one) is the unique name for the category. And the
-    regex_exp is the regular expression of the pattern for the category
+    regex_exp is the regular expression of the pattern for the category, built from the template and its sources
     """
 
     # what_subcategories
-    MISSING = "Missing What", ""
+    MISSING = "Missing What", "", ()
     CHANGE_LIST = (
         "change_list",
-        "(^[{}].*)([{}].*)".format(ordering_symbol_lst, ordering_symbol_lst) + "{1,}",
+        "(^[{}].*)([{}].*){{1,}}",
+        (Keywords(ORDERING_SYMBOL_FILE), Keywords(ORDERING_SYMBOL_FILE)),
     )
 
-    CONTRAST_BEFORE_AFTER = "contrast_before_after", "{}".format(
-        getKeywordFromFile(CHANGE_INDICATOR_FILE)
-    )
+    CONTRAST_BEFORE_AFTER = "contrast_before_after", "{}", (Keywords(CHANGE_INDICATOR_FILE),)
 
-    CHARACTERISTICS_CHANGE = "characteristics_change", "({})+|({})+({})*".format(
-        getKeywordFromFile(POSITIVE_OUTCOME_KEYWORD_FILE),
-        getKeywordFromFile(CODE_CHANGE_TYPE_KEYWORD_FILE),
-        getKeywordFromFile(UNDESIRED_BEHAVIOR_KEYWORD_FILE),
+    CHARACTERISTICS_CHANGE = (
+        "characteristics_change",
+        "({})+|({})+({})*",
+        (
+            Keywords(POSITIVE_OUTCOME_KEYWORD_FILE),
+            Keywords(CODE_CHANGE_TYPE_KEYWORD_FILE),
+            Keywords(UNDESIRED_BEHAVIOR_KEYWORD_FILE),
+        ),
     )
 
-    ILLUSTRATE_FUNCTION = "illustrate_function", "({})|({}+.*{}+)".format(
-        fix_defects_keyword_list,
-        getKeywordFromFile(NEGATION_KEYWORD),
-        UNDESIRED_BEHAVIOR_KEYWORD_FILE,
+    # the last source is the path of the keyword file itself rather than its keywords, kept as it has always been
+    ILLUSTRATE_FUNCTION = (
+        "illustrate_function",
+        "({})|({}+.*{}+)",
+        (Keywords(TO_FIX_DEFECTS_KEYWORD_FILE), Keywords(NEGATION_KEYWORD), UNDESIRED_BEHAVIOR_KEYWORD_FILE),
     )
 
+    @property
+    def regex_exp(self) -> str:
+        return get_regex_exp(self)
+
     def __str__(self) -> str:
         return self.name
 
 
+# Sources a preprocessed message must contain for the pattern of a category to match: at least one hit from every
+# group. They are necessary conditions read off the templates above, so skipping a category whose requirements are not
+# met never changes its decision. Categories that are not listed are always evaluated
+CATEGORY_REQUIREMENTS = {
+    WhyCategory.DESCRIBE_ERROR_SCENARIO: (("error",),),
+    WhyCategory.INTRODUCE_ISSUE_PR_REFERENCE: (("#",),),
+    WhyCategory.OUT_OF_DATE: ((Keywords(OUT_OF_DATE_KEYWORD_FILE),),),
+    WhyCategory.TO_FIX_DEFECTS: ((Keywords(TO_FIX_DEFECTS_KEYWORD_FILE),),),
+    WhyCategory.CONVENTIONS_AND_STANDARDS: ((Keywords(CONVENTIONS_AND_STANDARDS_KEYWORD_FILE),),),
+    WhyCategory.TEST_CASES: (("test",), (Keywords(TEST_VERB_KEYWORD_FILE),)),
+    WhyCategory.TYPOGRAPHIC_FIXES: (("typo",),),
+    WhyCategory.TEXT_FILE_CHANGES: (
+        (Keywords(TEXT_FILE_NOUN_KEYWORD_FILE),),
+        (Keywords(EDITING_VERB_KEYWORD_FILE),),
+    ),
+    WhyCategory.ANNOTATION_CHANGES: (
+        (Keywords(ANNOTATION_NOUN_KEYWORD_FILE),),
+        (Keywords(EDITING_VERB_KEYWORD_FILE),),
+    ),
+    WhatCategory.CHARACTERISTICS_CHANGE: (
+        (Keywords(POSITIVE_OUTCOME_KEYWORD_FILE), Keywords(CODE_CHANGE_TYPE_KEYWORD_FILE)),
+    ),
+    WhatCategory.ILLUSTRATE_FUNCTION: ((Keywords(TO_FIX_DEFECTS_KEYWORD_FILE), Keywords(NEGATION_KEYWORD)),),
+}
+
+_REGEX_SPECIAL_CHARS = set("\\^$*+?{}[]|()")
+
+
+def required_literal(keyword: str):
+    """
+    return a substring every match of the keyword contains, or None if there is none to rely on. Plain keywords are
+    their own literal; in keywords whose only special character is an unquantified ".", the longest dot-free piece is
+    """
+    if not keyword or _REGEX_SPECIAL_CHARS.intersection(keyword):
+        return None
+    return max(keyword.split("."), key=len) or None
+
+
+class KeywordIndex:
+    """
+    Find in one Aho-Corasick scan which requirement sources (see CATEGORY_REQUIREMENTS) a message contains, and tell
+    from these hits whether the pattern of a category can match at all
+    """
+
+    def __init__(self, requirements: dict = None):
+        requirements = CATEGORY_REQUIREMENTS if requirements is None else requirements
+        keyword_labels = {}
+        self.requirements = {}
+        # the same groups as alternations of their literals, to check the requirements of a whole Series at once
+        self.requirement_patterns = {}
+        for category, groups in requirements.items():
+            checked_groups = []
+            checked_patterns = []
+            for group in groups:
+                group_literals = {source: self.source_literals(source) for source in group}
+                # a group with a source that cannot be reduced to literals may always be satisfied
+                if any(literals is None for literals in group_literals.values()):
+                    continue
+                for source, literals in group_literals.items():
+                    for literal in literals:
+                        keyword_labels.setdefault(literal, set()).add(source)
+                checked_groups.append(frozenset(group))
+                literals = {literal for literals in group_literals.values() for literal in literals}
+                checked_patterns.append(re.compile("|".join(map(re.escape, sorted(literals)))))
+            self.requirements[category] = checked_groups
+            self.requirement_patterns[category] = checked_patterns
+        self.automaton = KeywordAutomaton(keyword_labels)
+
+    @classmethod
+    def from_tables(cls, requirements: dict, requirement_patterns: dict, automaton: KeywordAutomaton) -> "KeywordIndex":
+        """
+        return an index from the requirement groups, requirement patterns and automaton of one built before
+        """
+        index = cls.__new__(cls)
+        index.requirements = requirements
+        index.requirement_patterns = requirement_patterns
+        index.automaton = automaton
+        return index
+
+    @staticmethod
+    def source_literals(source):
+        keywords = load_keyword_list(source.file) if isinstance(source, Keywords) else [source]
+        literals = [required_literal(keyword) for keyword in keywords]
+        return None if not literals or None in literals else literals
+
+    def find_hits(self, commit_msg: str) -> set:
+        return self.automaton.find_labels(commit_msg)
+
+
+_keyword_index = None
+
+
+def get_keyword_index() -> KeywordIndex:
+    global _keyword_index
+    if _keyword_index is None:
+        _keyword_index = KeywordIndex()
+    return _keyword_index
+
+
+class CategoryMatcher:
+    """
+    Match preprocessed commit messages against all patterns of a category enum. The patterns are compiled once, and
+    they are tried from the last member to the first so that the first hit is the category the "last match wins" rule
+    picks; the remaining patterns are never evaluated for that message. Patterns whose required keywords are missing
+    from the message (see KeywordIndex) are skipped without running the regular expression
+    """
+
+    def __init__(self, category_factory, keyword_index: KeywordIndex = None):
+        self.category_factory = category_factory
+        self.keyword_index = get_keyword_index() if keyword_index is None else keyword_index
+        self.compiled_patterns = [(category, re.compile(category.regex_exp)) for category in category_factory]
+        self.patterns = dict(self.compiled_patterns)
+        self.reversed_patterns = [
+            (category, pattern, self.keyword_index.requirements.get(category, []))
+            for category, pattern in reversed(self.compiled_patterns)
+            if category is not category_factory.MISSING
+        ]
+
+    def match(self, commit_msg: str, hits: set = None, profiler: PatternProfiler = None):
+        """
+        return the category of commit_msg; hits are the keyword hits of the message if they were already computed.
+        With a profiler, every pattern evaluation is timed and the profiler's time budget is enforced
+        """
+        if hits is None:
+            hits = self.keyword_index.find_hits(commit_msg)
+        for category, pattern, groups in self.reversed_patterns:
+            if groups and not all(not group.isdisjoint(hits) for group in groups):
+                continue
+            if profiler is None:
+                if pattern.search(commit_msg):
+                    return category
+            elif profiler.budget_exhausted():
+                break
+            elif profiler.search(category, pattern, commit_msg):
+                return category
+        return self.category_factory.MISSING
+
+    def search_series(self, commit_msgs: pd.Series, category, candidates: np.ndarray = None) -> np.ndarray:
+        """
+        return whether the pattern of category matches each message of a Series of preprocessed messages. Only the
+        candidates (all messages by default) whose required keywords are present are searched, the rest are False
+        """
+        candidates = np.ones(len(commit_msgs), dtype=bool) if candidates is None else candidates.copy()
+        with warnings.catch_warnings():
+            # str.contains warns about the match groups of the patterns, which do not matter for a search
+            warnings.simplefilter("ignore", UserWarning)
+            for requirement in self.keyword_index.requirement_patterns.get(category, []):
+                if candidates.any():
+                    candidates[candidates] = commit_msgs[candidates].str.contains(requirement).to_numpy(dtype=bool)
+            if candidates.any():
+                candidates[candidates] = commit_msgs[candidates].str.contains(
+                    self.patterns[category]).to_numpy(dtype=bool)
+        return candidates
+
+    def match_series(self, commit_msgs: pd.Series) -> np.ndarray:
+        """
+        return the category names of a Series of preprocessed messages, evaluating one pattern at a time over all the
+        messages that are still undecided and whose required keywords are present
+        """
+        names = np.full(len(commit_msgs), self.category_factory.MISSING.name, dtype=object)
+        undecided = np.ones(len(commit_msgs), dtype=bool)
+        for category, _, _ in self.reversed_patterns:
+            if not undecided.any():
+                break
+            matched = self.search_series(commit_msgs, category, undecided)
+            names[matched] = category.name
+            undecided &= ~matched
+        return names
+
+    def find_all(self, commit_msg: str) -> list:
+        """
+        return the matched substrings of every pattern that matches, in enum order
+        """
+        return [pattern.findall(commit_msg) for _, pattern in self.compiled_patterns if pattern.search(commit_msg)]
+
+
+_category_matchers = {}
+
+
+def get_category_matcher(category_factory) -> CategoryMatcher:
+    """
+    return the shared matcher of the category enum, compiling it on first use
+    """
+    if category_factory not in _category_matchers:
+        _category_matchers[category_factory] = CategoryMatcher(category_factory)
+    return _category_matchers[category_factory]
+
+
+def reload_patterns() -> None:
+    """
+    forget the keywords, expanded patterns, keyword index and matchers, so that edited pattern files are read again
+    on next use
+    """
+    global _keyword_index
+    _keywords.clear()
+    _regex_exps.clear()
+    _category_matchers.clear()
+    _keyword_index = None
+
+
+def install_patterns(keyword_lists: dict, regex_exps: dict, keyword_index: KeywordIndex) -> None:
+    """
+    replace the keywords, expanded patterns and keyword index with ones computed before (see classfier.PatternBundle);
+    keyword_lists is keyed by file path and regex_exps by category
+    """
+    global _keyword_index
+    reload_patterns()
+    _keywords.update(keyword_lists)
+    _regex_exps.update(regex_exps)
+    _keyword_index = keyword_index
+
+
+def category_key(category) -> str:
+    return "{}.{}".format(type(category).__name__, category._name_)
+
+
+def category_pattern_files(category) -> set:
+    """
+    return the data/pattern files whose keywords the pattern of category is built from
+    """
+    return {source.file for source in category.sources if isinstance(source, Keywords)}
+
+
+def is_good_classified(why_subcategory, what_subcategory) -> np.ndarray:
+    """
+    return for every message whether both its why and what category lists are non-empty and free of the MISSING
+    category, computed column-wise over the exploded lists
+    """
+    good = np.ones(len(why_subcategory), dtype=bool)
+    for categories, missing in ((why_subcategory, WhyCategory.MISSING.name),
+                                (what_subcategory, WhatCategory.MISSING.name)):
+        categories = pd.Series(list(categories), dtype=object)
+        has_missing = categories.explode().eq(missing).groupby(level=0).any().to_numpy(dtype=bool)
+        good &= categories.str.len().to_numpy() != 0
+        good &= ~has_missing
+    return good
+
+
+def build_results(commit_msgs, preprocessed_msgs, why_subcategory, what_subcategory) -> pd.DataFrame:
+    """
+    assemble the classification results of a list of messages into a DataFrame
+    """
+    d = {'message': commit_msgs,
+         'preprocessed': preprocessed_msgs,
+         'why_subcategory': why_subcategory,
+         'what_subcategory': what_subcategory}
+    df = pd.DataFrame(d)
+    df['good_classified'] = is_good_classified(df['why_subcategory'], df['what_subcategory'])
+    return df
+
+
 class CommitClassifier:
-    def __init__(self, commit_msgs: list[str], verbose: bool = False):
+    def __init__(self, commit_msgs: list[str], verbose: bool = False, workers: int = 1, chunk_size: int = 500,
+                 cache: ResultCache = None, profiler: PatternProfiler = None):
         """
-        return list of categories for commit_msg
+        return list of categories for commit_msg. With workers > 1, classify() spreads chunks of chunk_size messages
+        over a process pool. With a cache (see open_result_cache), messages classified before are not classified again.
+        With a profiler, the time of every pattern is recorded and its time budget applies; profiling runs serially
+        and bypasses the cache, since profiled results may be partial (see PatternProfiler) and cached ones would not
+        be timed
         """
         self.commit_msgs = commit_msgs
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.profiler = profiler
         self.preprocessed_msgs = []
         self.what_subcategory = []
         self.why_subcategory = []
         self.results = None
         self.verbose = verbose
 
+    def preprocess_message(self, commit_msg: str) -> str:
+        """
+        preprocess a single commit_msg
+        """
+        tokenized_lst = stem_tokenize(commit_msg)
+        tokenized_msg = " ".join(tokenized_lst)
+        # tokenized_msg = remove_stop_words(tokenized_msg)
+        tokenized_msg = denoise(tokenized_msg)
+        if self.verbose:
+            print(
+                "raw string: {}, preprocessed string: {}\n".format(
+                    commit_msg, tokenized_msg
+                )
+            )
+        return tokenized_msg
+
     def preprocess(self):
         """
         preprocess commit_msg
         """
         for commit_msg in self.commit_msgs:
-            tokenized_lst = stem_tokenize(commit_msg)
-            tokenized_msg = " ".join(tokenized_lst)
-            # tokenized_msg = remove_stop_words(tokenized_msg)
-            tokenized_msg = denoise(tokenized_msg)
-            self.preprocessed_msgs.append(tokenized_msg)
-            if self.verbose:
-                print(
-                    "raw string: {}, preprocessed string: {}\n".format(
-                        commit_msg, tokenized_msg
-                    )
-                )
+            self.preprocessed_msgs.append(self.preprocess_message(commit_msg))
 
-    def match_category(self, category_factory, commit_msg):
-        commit_categories = []
-        matched_substrings = []
-        matched_pattern = None
-        for pattern in category_factory:
-            if re.search(pattern.regex_exp, commit_msg):
-                if self.verbose:
-                    matched_substrings.append(
-                        re.findall(pattern.regex_exp, commit_msg)
-                    )
-                matched_pattern = pattern
-        if matched_pattern is None:
-            matched_pattern = category_factory.MISSING
-        commit_categories.append(matched_pattern.name)
+    def match_category(self, category_factory, commit_msg, hits: set = None):
+        matcher = get_category_matcher(category_factory)
+        matched_substrings = matcher.find_all(commit_msg) if self.verbose else []
+        commit_categories = [matcher.match(commit_msg, hits, self.profiler).name]
         return commit_categories, matched_substrings
 
-    def classify(self):
-        self.preprocess()
-        for commit_msg in self.preprocessed_msgs:
-            why_commit_categories, why_matched_substrings = self.match_category(WhyCategory, commit_msg)
-            what_commit_categories, what_matched_substrings = self.match_category(WhatCategory, commit_msg)
-            if self.verbose:
-                print(
-                    "Preprocessed: {}, Why Categories: {} Why Matched substrings: {}\n What Categories: {} What Matched substrings: {}\n"
-                    .format(commit_msg, why_commit_categories, why_matched_substrings, what_commit_categories,
-                            what_matched_substrings
-                            )
-                )
+    def match_message(self, commit_msg: str):
+        """
+        return the why and what categories of a preprocessed commit_msg
+        """
+        if self.profiler is not None:
+            self.profiler.start_message(commit_msg)
+        hits = get_keyword_index().find_hits(commit_msg)
+        why_commit_categories, why_matched_substrings = self.match_category(WhyCategory, commit_msg, hits)
+        what_commit_categories, what_matched_substrings = self.match_category(WhatCategory, commit_msg, hits)
+        if self.verbose:
+            print(
+                "Preprocessed: {}, Why Categories: {} Why Matched substrings: {}\n What Categories: {} What Matched substrings: {}\n"
+                .format(commit_msg, why_commit_categories, why_matched_substrings, what_commit_categories,
+                        what_matched_substrings
+                        )
+            )
+        return why_commit_categories, what_commit_categories
+
+    def classify_messages(self, commit_msgs: list[str], executor: ProcessPoolExecutor = None) -> tuple:
+        """
+        preprocess and match a list of messages, chunk by chunk in a process pool if an executor is given (see
+        create_classifier_pool) or workers > 1. executor.map keeps the chunks in input order, so the results are
+        identical to the serial run. Return the preprocessed messages and the why/what categories
+        """
+        if self.profiler is not None or executor is None and self.workers <= 1:
+            preprocessed_msgs = [self.preprocess_message(commit_msg) for commit_msg in commit_msgs]
+            why_subcategory, what_subcategory = [], []
+            for commit_msg in preprocessed_msgs:
+                why_commit_categories, what_commit_categories = self.match_message(commit_msg)
+                why_subcategory.append(why_commit_categories)
+                what_subcategory.append(what_commit_categories)
+            return preprocessed_msgs, why_subcategory, what_subcategory
+
+        chunks = [commit_msgs[i:i + self.chunk_size] for i in range(0, len(commit_msgs), self.chunk_size)]
+        if executor is None:
+            with create_classifier_pool(self.workers, self.verbose) as pool:
+                chunk_results = list(pool.map(classify_chunk, chunks))
+        else:
+            chunk_results = list(executor.map(classify_chunk, chunks))
+        preprocessed_msgs, why_subcategory, what_subcategory = [], [], []
+        for chunk_preprocessed_msgs, chunk_why_subcategory, chunk_what_subcategory in chunk_results:
+            preprocessed_msgs.extend(chunk_preprocessed_msgs)
+            why_subcategory.extend(chunk_why_subcategory)
+            what_subcategory.extend(chunk_what_subcategory)
+        return preprocessed_msgs, why_subcategory, what_subcategory
+
+    def classify_unique(self, commit_msgs: list[str], executor: ProcessPoolExecutor = None) -> list[tuple]:
+        """
+        classify every distinct message once, looking it up in the result cache first if there is one, and fan the
+        results out to the repeated messages. Return (preprocessed, why_subcategory, what_subcategory) per message.
+        The cache is neither read nor written while profiling
+        """
+        unique_msgs = list(dict.fromkeys(commit_msgs))
+        cache = self.cache if self.profiler is None else None
+        results = cache.get_many(unique_msgs) if cache is not None else {}
+        pending_msgs = [commit_msg for commit_msg in unique_msgs if commit_msg not in results]
+        if pending_msgs:
+            classified = list(zip(*self.classify_messages(pending_msgs, executor)))
+            results.update(zip(pending_msgs, classified))
+            if cache is not None:
+                cache.put_many(zip(pending_msgs, classified))
+        return [
+            (results[commit_msg][0], list(results[commit_msg][1]), list(results[commit_msg][2]))
+            for commit_msg in commit_msgs
+        ]
+
+    def classify(self, executor: ProcessPoolExecutor = None):
+        """
+        classify all messages, in a process pool if an executor is given (see create_classifier_pool) or workers > 1
+        """
+        for preprocessed_msg, why_commit_categories, what_commit_categories in self.classify_unique(
+                list(self.commit_msgs), executor):
+            self.preprocessed_msgs.append(preprocessed_msg)
             self.why_subcategory.append(why_commit_categories)
             self.what_subcategory.append(what_commit_categories)
         self.save_results()
 
+    def classify_iter(self, commit_msgs: Iterable[str], batch_size: int = 1000,
+                      executor: ProcessPoolExecutor = None) -> Iterator[pd.DataFrame]:
+        """
+        classify commit messages from any iterable lazily and yield the results batch by batch, so that only one batch
+        of messages is held in memory at a time. Each yielded DataFrame has the columns of get_results() and is indexed
+        by the position of the message in the input
+        """
+        commit_msgs = iter(commit_msgs)
+        offset = 0
+        while True:
+            batch = list(islice(commit_msgs, batch_size))
+            if not batch:
+                return
+            preprocessed_msgs, why_subcategory, what_subcategory = (
+                list(column) for column in zip(*self.classify_unique(batch, executor)))
+            df = build_results(batch, preprocessed_msgs, why_subcategory, what_subcategory)
+            df.index = pd.RangeIndex(offset, offset + len(batch))
+            offset += len(batch)
+            yield df
+
+    def classify_frame(self, df: pd.DataFrame, column: str = "message") -> pd.DataFrame:
+        """
+        classify the messages of a DataFrame column-wise: every distinct message is tokenized once, the denoising and
+        each category pattern run over the whole Series, and the categories and good_classified are derived with array
+        operations. Missing messages are classified as empty ones. Return the results in the format of get_results(),
+        indexed like df
+        """
+        codes, unique_msgs = pd.factorize(df[column].fillna(""))
+        tokenized_msgs = pd.Series([" ".join(stem_tokenize(commit_msg)) for commit_msg in unique_msgs], dtype=object)
+        preprocessed_msgs = denoise_series(tokenized_msgs)
+        why_names = get_category_matcher(WhyCategory).match_series(preprocessed_msgs)[codes]
+        what_names = get_category_matcher(WhatCategory).match_series(preprocessed_msgs)[codes]
+
+        results = pd.DataFrame({
+            'message': df[column].to_numpy(),
+            'preprocessed': preprocessed_msgs.to_numpy()[codes],
+            'why_subcategory': [[name] for name in why_names],
+            'what_subcategory': [[name] for name in what_names],
+            'good_classified': (why_names != WhyCategory.MISSING.name) & (what_names != WhatCategory.MISSING.name),
+        }, index=df.index)
+        self.results = results
+        return results.copy()
+
     def save_results(self):
-        d = {'message': self.commit_msgs,
-             'preprocessed': self.preprocessed_msgs,
-             'why_subcategory': self.why_subcategory,
-             'what_subcategory': self.what_subcategory}
-        df = pd.DataFrame(d)
-        df['good_classified'] = df.apply(lambda x: len(x.why_subcategory) != 0 and len(x.what_subcategory) != 0
-                                                   and WhyCategory.MISSING.name not in x.why_subcategory
-                                                   and WhatCategory.MISSING.name not in x.what_subcategory, axis=1)
-        self.results = df
+        self.results = build_results(self.commit_msgs, self.preprocessed_msgs, self.why_subcategory,
+                                     self.what_subcategory)
 
     def get_results(self):
         return self.results.copy()
@@ -209,6 +641,77 @@ class CommitClassifier:
             ))
 
 
+def pattern_fingerprint() -> str:
+    """
+    return a digest of the preprocessing version and the expanded pattern of every category
+    """
+    digest = hashlib.sha256(str(PREPROCESSING_VERSION).encode())
+    for category_factory in (WhyCategory, WhatCategory):
+        for category in category_factory:
+            digest.update("{}\0{}\0".format(category.name, category.regex_exp).encode())
+    return digest.hexdigest()
+
+
+def open_result_cache(path: str, max_entries: int = 1000000) -> ResultCache:
+    """
+    open the result cache at path for the current patterns and preprocessing
+    """
+    return ResultCache(path, pattern_fingerprint(), max_entries)
+
+
+_worker_classifier = None
+
+
+def init_classifier_worker(verbose: bool = False, cache_path: str = None, bundle_path: str = None):
+    """
+    warm up a pool worker once: load the NLTK resources, the token caches saved at cache_path (see save_caches), the
+    pattern bundle at bundle_path (see classfier.PatternBundle) and compile the category patterns before the first chunk
+    """
+    global _worker_classifier
+    if cache_path is not None and os.path.exists(cache_path):
+        load_caches(cache_path)
+    if bundle_path is not None:
+        from classfier.PatternBundle import load_pattern_bundle
+
+        load_pattern_bundle(bundle_path)
+    _worker_classifier = CommitClassifier([], verbose)
+    get_category_matcher(WhyCategory)
+    get_category_matcher(WhatCategory)
+    _worker_classifier.preprocess_message("warm up")
+
+
+def get_worker_classifier() -> CommitClassifier:
+    """
+    return the classifier of the current pool worker, warming the worker up on first use
+    """
+    if _worker_classifier is None:
+        init_classifier_worker()
+    return _worker_classifier
+
+
+def classify_chunk(commit_msgs: list[str]):
+    """
+    classify a chunk of messages in a pool worker, return the preprocessed messages and the why/what categories
+    """
+    classifier = get_worker_classifier()
+    preprocessed_msgs = [classifier.preprocess_message(commit_msg) for commit_msg in commit_msgs]
+    why_subcategory, what_subcategory = [], []
+    for commit_msg in preprocessed_msgs:
+        why_commit_categories, what_commit_categories = classifier.match_message(commit_msg)
+        why_subcategory.append(why_commit_categories)
+        what_subcategory.append(what_commit_categories)
+    return preprocessed_msgs, why_subcategory, what_subcategory
+
+
+def create_classifier_pool(workers: int, verbose: bool = False, cache_path: str = None,
+                           bundle_path: str = None) -> ProcessPoolExecutor:
+    """
+    create a process pool whose workers are warmed up for classify_chunk. One pool can be shared by several classifiers
+    """
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_classifier_worker,
+                               initargs=(verbose, cache_path, bundle_path))
+
+
 if __name__ == "__main__":
     """
     pipeline for classifying a single commit message
@@ -224,6 +727,7 @@ if __name__ == "__main__":
         "categoryTest add"
     ]
 
+    ensure_nltk_resources(download=True)
     commit_classifier = CommitClassifier(commit_msg_test, False)
     commit_classifier.classify()
     commit_classifier.pretty_print()
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from classfier.CommitClassfier import (
+    PATTERN_DIR,
+    PREPROCESSING_VERSION,
+    CommitClassifier,
+    WhatCategory,
+    WhyCategory,
+    build_results,
+    category_key,
+    category_pattern_files,
+    get_category_matcher,
+    reload_patterns,
+)
+
+SEGMENT_DIR = "segments"
+MANIFEST_FILE = "manifest.json"
+# the segments are compacted into one once there are more, so that loading the state stays a few reads
+MAX_SEGMENTS = 32
+BITS_COLUMNS = {WhyCategory: "why_bits", WhatCategory: "what_bits"}
+
+
+def file_fingerprints(pattern_dir: str = PATTERN_DIR) -> dict:
+    """
+    return the SHA-256 of every file in pattern_dir by path
+    """
+    fingerprints = {}
+    for file_name in sorted(os.listdir(pattern_dir)):
+        path = os.path.join(pattern_dir, file_name)
+        with open(path, "rb") as f:
+            fingerprints[path] = hashlib.sha256(f.read()).hexdigest()
+    return fingerprints
+
+
+def affected_categories(changed_files: set) -> list:
+    """
+    return the members of WhyCategory and WhatCategory whose patterns read one of changed_files
+    """
+    return [category for category_factory in (WhyCategory, WhatCategory) for category in category_factory
+            if category_pattern_files(category) & changed_files]
+
+
+def combine_bits(bits: np.ndarray, category_factory) -> np.ndarray:
+    """
+    return the category names from per-category match bits with the "last match wins" rule: the highest set bit
+    except MISSING's, or MISSING if none is set
+    """
+    members = list(category_factory)
+    names = np.full(len(bits), category_factory.MISSING.name, dtype=object)
+    for position, category in enumerate(members):
+        if category is category_factory.MISSING:
+            continue
+        names[(bits >> position) & 1 == 1] = category.name
+    return names
+
+
+def empty_state() -> pd.DataFrame:
+    state = pd.DataFrame({"preprocessed": pd.Series(dtype=object), "why_bits": pd.Series(dtype=np.int64),
+                          "what_bits": pd.Series(dtype=np.int64), "segment": pd.Series(dtype=np.int64)})
+    state.index = pd.Index([], dtype=object, name="message")
+    return state
+
+
+class IncrementalClassifier:
+    """
+    Classifier that keeps, in state_dir, the preprocessed text and the match bit of every category for each message
+    it has classified, together with the fingerprints of the pattern files and the expanded patterns they were
+    computed with. On the next run only the categories whose pattern changed are evaluated again, over the stored
+    preprocessed text, and only new messages are preprocessed; the categories are then recombined from the bits.
+
+    The state is stored in segments: the new messages of a run are appended as a segment of their own, and a stored
+    segment is only written again if the bits of one of its messages changed. Messages that are no longer needed are
+    dropped with prune
+    """
+
+    def __init__(self, state_dir: str):
+        self.state_dir = state_dir
+        self.last_run = {}
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.state_dir, SEGMENT_DIR, "{}.pkl".format(segment))
+
+    def load_state(self):
+        """
+        return the stored messages, with the segment each one is stored in, and the manifest, or (None, None) if
+        there is no usable state
+        """
+        manifest_path = os.path.join(self.state_dir, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None, None
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("preprocessing_version") != PREPROCESSING_VERSION or "segments" not in manifest:
+            return None, None
+        segments = [pd.read_pickle(self.segment_path(segment)).assign(segment=segment)
+                    for segment in manifest["segments"]]
+        return (pd.concat(segments) if segments else empty_state()), manifest
+
+    def save_state(self, state: pd.DataFrame, dirty_segments: set, fingerprints: dict,
+                   regex_exps: dict = None) -> None:
+        """
+        write the segments in dirty_segments, then the manifest listing the segments of state, then remove the
+        segment files no longer listed. A run that stops halfway leaves the previous manifest, whose fingerprints make
+        the next run evaluate any rewritten segment again
+        """
+        os.makedirs(os.path.join(self.state_dir, SEGMENT_DIR), exist_ok=True)
+        segments = state["segment"].to_numpy()
+        for segment in sorted(dirty_segments):
+            rows = state[segments == segment]
+            if len(rows):
+                rows.drop(columns="segment").to_pickle(self.segment_path(segment))
+        live_segments = sorted(int(segment) for segment in np.unique(segments))
+        manifest = {
+            "preprocessing_version": PREPROCESSING_VERSION,
+            "file_fingerprints": fingerprints,
+            "regex_exps": current_regex_exps() if regex_exps is None else regex_exps,
+            "segments": live_segments,
+        }
+        manifest_path = os.path.join(self.state_dir, MANIFEST_FILE)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        for file_name in os.listdir(os.path.join(self.state_dir, SEGMENT_DIR)):
+            if file_name.endswith(".pkl") and int(file_name[:-len(".pkl")]) not in live_segments:
+                os.remove(os.path.join(self.state_dir, SEGMENT_DIR, file_name))
+
+    def prune(self, commit_msgs) -> int:
+        """
+        drop the stored messages that are not among commit_msgs, e.g. those of corpora that are no longer classified.
+        Only the segments that lose messages are written again. Return the number of messages dropped
+        """
+        state, manifest = self.load_state()
+        if state is None:
+            return 0
+        keep = state.index.isin(list(commit_msgs))
+        if keep.all():
+            return 0
+        dirty_segments = set(state["segment"].to_numpy()[~keep].tolist())
+        self.save_state(state[keep], dirty_segments, manifest["file_fingerprints"], manifest["regex_exps"])
+        return int((~keep).sum())
+
+    def classify(self, commit_msgs) -> pd.DataFrame:
+        """
+        classify commit_msgs, reusing the stored state where the patterns did not change; return the results in the
+        format of CommitClassifier.get_results()
+        """
+        reload_patterns()
+        fingerprints = file_fingerprints()
+        state, manifest = self.load_state()
+        if state is None:
+            state = empty_state()
+            changed_files = set(fingerprints)
+            changed_categories = [category for category_factory in BITS_COLUMNS for category in category_factory]
+        else:
+            old_fingerprints = manifest["file_fingerprints"]
+            changed_files = {path for path in set(fingerprints) | set(old_fingerprints)
+                             if fingerprints.get(path) != old_fingerprints.get(path)}
+            # a category is evaluated again if one of its keyword files or its expanded pattern changed
+            old_regex_exps = manifest["regex_exps"]
+            file_affected = set(affected_categories(changed_files))
+            changed_categories = [category for category_factory in BITS_COLUMNS for category in category_factory
+                                  if category in file_affected
+                                  or old_regex_exps.get(category_key(category)) != category.regex_exp]
+
+        # new messages are preprocessed and evaluated against every category, and stored as a new segment
+        commit_msgs = list(commit_msgs)
+        new_msgs = [commit_msg for commit_msg in dict.fromkeys(commit_msgs) if commit_msg not in state.index]
+        next_segment = int(state["segment"].max()) + 1 if len(state) else 0
+        if new_msgs:
+            classifier = CommitClassifier([])
+            new_state = pd.DataFrame({"preprocessed": [classifier.preprocess_message(commit_msg)
+                                                       for commit_msg in new_msgs],
+                                      "why_bits": 0, "what_bits": 0, "segment": next_segment},
+                                     index=pd.Index(new_msgs, dtype=object, name="message"))
+            new_state["why_bits"] = self.evaluate_bits(new_state["preprocessed"], WhyCategory, list(WhyCategory))
+            new_state["what_bits"] = self.evaluate_bits(new_state["preprocessed"], WhatCategory, list(WhatCategory))
+        old_index = state.index
+
+        # stored messages are only evaluated again for the categories whose pattern changed, and only the segments
+        # whose bits changed are written again
+        dirty_segments = set()
+        for category_factory, column in BITS_COLUMNS.items():
+            categories = [category for category in changed_categories if isinstance(category, category_factory)]
+            if categories and len(state):
+                bits = self.evaluate_bits(state["preprocessed"], category_factory, categories,
+                                          state[column].to_numpy())
+                dirty_segments.update(state["segment"].to_numpy()[bits != state[column].to_numpy()].tolist())
+                state[column] = bits
+        if new_msgs:
+            state = pd.concat([state, new_state])
+            dirty_segments.add(next_segment)
+        if state["segment"].nunique() > MAX_SEGMENTS:
+            # compacted into a segment with a new number, so the files of the previous manifest stay intact
+            state["segment"] = next_segment + 1
+            dirty_segments = {next_segment + 1}
+        self.save_state(state, dirty_segments, fingerprints)
+
+        self.last_run = {
+            "changed_files": sorted(changed_files),
+            "changed_categories": [category.name for category in changed_categories],
+            "new_messages": len(new_msgs),
+            "reused_messages": int(old_index.isin(commit_msgs).sum()),
+        }
+        rows = state.loc[commit_msgs]
+        why_names = combine_bits(rows["why_bits"].to_numpy(), WhyCategory)
+        what_names = combine_bits(rows["what_bits"].to_numpy(), WhatCategory)
+        return build_results(commit_msgs, rows["preprocessed"].tolist(), [[name] for name in why_names],
+                             [[name] for name in what_names])
+
+    @staticmethod
+    def evaluate_bits(preprocessed_msgs: pd.Series, category_factory, categories: list,
+                      bits: np.ndarray = None) -> np.ndarray:
+        """
+        set the bit of each of categories in bits (all zero by default) to whether its pattern matches the message
+        """
+        preprocessed_msgs = preprocessed_msgs.reset_index(drop=True)
+        bits = np.zeros(len(preprocessed_msgs), dtype=np.int64) if bits is None else bits.astype(np.int64)
+        matcher = get_category_matcher(category_factory)
+        positions = {category: position for position, category in enumerate(category_factory)}
+        for category in categories:
+            bit = np.int64(1) << positions[category]
+            matched = matcher.search_series(preprocessed_msgs, category)
+            bits = np.where(matched, bits | bit, bits & ~bit)
+        return bits
+
+
+def current_regex_exps() -> dict:
+    return {category_key(category): category.regex_exp for category_factory in BITS_COLUMNS
+            for category in category_factory}
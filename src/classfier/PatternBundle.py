@@ -0,0 +1,205 @@
+import argparse
+import hashlib
+import os
+import pickle
+import re
+
+from classfier.CommitClassfier import (
+    CATEGORY_REQUIREMENTS,
+    PACKAGED_PATTERN_DIR,
+    PATTERN_DIR,
+    PREPROCESSING_VERSION,
+    ROOT_DIR,
+    KeywordIndex,
+    Keywords,
+    WhatCategory,
+    WhyCategory,
+    category_key,
+    get_keyword_index,
+    install_patterns,
+    load_keyword_list,
+    reload_patterns,
+)
+from util.KeywordAutomaton import KeywordAutomaton
+
+# bump whenever the layout of the bundle changes
+BUNDLE_VERSION = 2
+# kept in the checkout, or in the user cache directory for an installed package
+BUNDLE_PATH = (os.path.join(os.path.expanduser("~"), ".cache", "commit-pattern-study", "pattern_bundle.pkl")
+               if PATTERN_DIR == PACKAGED_PATTERN_DIR else os.path.join(ROOT_DIR, ".cache", "pattern_bundle.pkl"))
+CATEGORY_FACTORIES = (WhyCategory, WhatCategory)
+# stands for PATTERN_DIR in the stored patterns, which can contain paths below it (see source_token)
+PATTERN_DIR_PLACEHOLDER = "\0pattern_dir\0"
+
+
+def source_token(source) -> str:
+    """
+    return a path independent name of a pattern source: the file name of a keyword file, the file name of a literal
+    that is a path in PATTERN_DIR (a pattern can take a file path as it is rather than its keywords) or else the literal
+    itself
+    """
+    if isinstance(source, Keywords):
+        return "file:" + os.path.relpath(source.file, PATTERN_DIR)
+    if source.startswith(PATTERN_DIR):
+        return "path:" + source[len(PATTERN_DIR):]
+    return "literal:" + source
+
+
+def token_source(token: str):
+    kind, _, value = token.partition(":")
+    if kind == "file":
+        return Keywords(PATTERN_DIR + value)
+    return PATTERN_DIR + value if kind == "path" else value
+
+
+def pattern_file_stamps(pattern_dir: str = PATTERN_DIR) -> dict:
+    """
+    return the size and modification time of every file in pattern_dir, to tell without reading them that the files
+    did not change
+    """
+    stamps = {}
+    for file_name in sorted(os.listdir(pattern_dir)):
+        stat = os.stat(os.path.join(pattern_dir, file_name))
+        stamps[file_name] = [stat.st_size, stat.st_mtime_ns]
+    return stamps
+
+
+def pattern_dir_checksum(pattern_dir: str = PATTERN_DIR) -> str:
+    """
+    return the SHA-256 of the names and contents of all files in pattern_dir
+    """
+    digest = hashlib.sha256()
+    for file_name in sorted(os.listdir(pattern_dir)):
+        with open(os.path.join(pattern_dir, file_name), "rb") as f:
+            content = f.read()
+        digest.update(file_name.encode())
+        digest.update(len(content).to_bytes(8, "little"))
+        digest.update(content)
+    return digest.hexdigest()
+
+
+def definitions_digest() -> str:
+    """
+    return a digest of what the bundle depends on besides the pattern files: the versions, the templates and sources
+    of the categories and the keyword requirements
+    """
+    definitions = [BUNDLE_VERSION, PREPROCESSING_VERSION]
+    for category_factory in CATEGORY_FACTORIES:
+        for category in category_factory:
+            definitions.append((category_key(category), category.name, category.template,
+                                [source_token(source) for source in category.sources]))
+    for category, groups in CATEGORY_REQUIREMENTS.items():
+        definitions.append((category_key(category), [[source_token(source) for source in group] for group in groups]))
+    return hashlib.sha256(repr(definitions).encode()).hexdigest()
+
+
+def build_pattern_bundle() -> dict:
+    """
+    read the pattern files and compute the keyword lists, the expanded expression of every category and the tables of
+    the keyword index, in a form that does not depend on where the repository lives
+    """
+    reload_patterns()
+    keyword_files = sorted({source.file for category_factory in CATEGORY_FACTORIES for category in category_factory
+                            for source in category.sources if isinstance(source, Keywords)}
+                           | {source.file for groups in CATEGORY_REQUIREMENTS.values() for group in groups
+                              for source in group if isinstance(source, Keywords)})
+    keyword_index = get_keyword_index()
+    automaton = keyword_index.automaton
+    return {
+        "bundle_version": BUNDLE_VERSION,
+        "definitions": definitions_digest(),
+        "checksum": pattern_dir_checksum(),
+        "stamps": pattern_file_stamps(),
+        "keywords": {os.path.relpath(file, PATTERN_DIR): load_keyword_list(file) for file in keyword_files},
+        "regex_exps": {category_key(category): category.regex_exp.replace(PATTERN_DIR, PATTERN_DIR_PLACEHOLDER)
+                       for category_factory in CATEGORY_FACTORIES for category in category_factory},
+        "requirements": {category_key(category): [sorted(source_token(source) for source in group)
+                                                  for group in groups]
+                         for category, groups in keyword_index.requirements.items()},
+        "requirement_patterns": {category_key(category): [pattern.pattern for pattern in patterns]
+                                 for category, patterns in keyword_index.requirement_patterns.items()},
+        "automaton": {
+            "goto": automaton.goto,
+            "fail": automaton.fail,
+            "output": [sorted(source_token(source) for source in labels) for labels in automaton.output],
+        },
+    }
+
+
+def install_bundle(bundle: dict) -> None:
+    """
+    make the classifier use the patterns of a bundle instead of reading and expanding them again
+    """
+    categories = {category_key(category): category for category_factory in CATEGORY_FACTORIES
+                  for category in category_factory}
+    automaton = bundle["automaton"]
+    keyword_index = KeywordIndex.from_tables(
+        {categories[key]: [frozenset(map(token_source, group)) for group in groups]
+         for key, groups in bundle["requirements"].items()},
+        {categories[key]: [re.compile(pattern) for pattern in patterns]
+         for key, patterns in bundle["requirement_patterns"].items()},
+        KeywordAutomaton.from_tables(automaton["goto"], automaton["fail"],
+                                     [[token_source(token) for token in labels] for labels in automaton["output"]]),
+    )
+    install_patterns({PATTERN_DIR + file_name: keywords for file_name, keywords in bundle["keywords"].items()},
+                     {categories[key]: regex_exp.replace(PATTERN_DIR_PLACEHOLDER, PATTERN_DIR)
+                      for key, regex_exp in bundle["regex_exps"].items()},
+                     keyword_index)
+
+
+def is_current(bundle: dict) -> bool:
+    """
+    return whether a bundle was built from the current definitions and pattern files. The files are only read when
+    their sizes or modification times differ from the ones recorded in the bundle
+    """
+    if bundle.get("bundle_version") != BUNDLE_VERSION or bundle.get("definitions") != definitions_digest():
+        return False
+    return bundle["stamps"] == pattern_file_stamps() or bundle["checksum"] == pattern_dir_checksum()
+
+
+def save_pattern_bundle(bundle: dict, path: str = BUNDLE_PATH) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # written to a temporary file first so that concurrent workers never read a partial bundle
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_pattern_bundle(path: str = BUNDLE_PATH, rebuild: bool = True) -> bool:
+    """
+    install the pattern bundle at path with a single read. If it is missing or out of date it is built again from the
+    pattern files and saved when rebuild is set, or else the patterns are left to be read lazily as usual. Return
+    whether a bundle was installed
+    """
+    bundle = None
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                bundle = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            bundle = None
+    if bundle is None or not is_current(bundle):
+        if not rebuild:
+            return False
+        bundle = build_pattern_bundle()
+        save_pattern_bundle(bundle, path)
+    install_bundle(bundle)
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="build the pattern bundle that classifier workers start from")
+    parser.add_argument("--output", default=BUNDLE_PATH)
+    parser.add_argument("--check", action="store_true", help="only report whether the bundle is up to date")
+    args = parser.parse_args()
+
+    if args.check:
+        current = False
+        if os.path.exists(args.output):
+            with open(args.output, "rb") as f:
+                current = is_current(pickle.load(f))
+        print("{} is {}".format(args.output, "up to date" if current else "out of date"))
+    else:
+        save_pattern_bundle(build_pattern_bundle(), args.output)
+        print("wrote {}".format(args.output))
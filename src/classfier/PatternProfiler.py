@@ -0,0 +1,126 @@
+import heapq
+import json
+import time
+
+
+class PatternProfiler:
+    """
+    Record how long every category pattern takes to match: the number of evaluations, the cumulative and the worst
+    time per category, and the slowest (message, category) pairs overall.
+
+    With a time budget in seconds, a message whose matching time exceeds the budget is flagged. In "abort" mode the
+    patterns are run by the regex module (an optional dependency) with the rest of the budget as timeout, so a runaway
+    search is interrupted once the budget is spent; it and the patterns that are left for the message count as not
+    matching, so the categories of an aborted message are partial (often MISSING)
+    """
+
+    def __init__(self, budget: float = None, on_budget: str = "flag", slowest: int = 20):
+        if on_budget not in ("flag", "abort"):
+            raise ValueError("on_budget must be 'flag' or 'abort', got {}".format(on_budget))
+        if on_budget == "abort" and budget is not None:
+            try:
+                import regex  # noqa: F401
+            except ImportError:
+                raise ImportError("on_budget='abort' needs the regex module to interrupt searches, pip install regex")
+        self.budget = budget
+        self.on_budget = on_budget
+        self.slowest = slowest
+        self.pattern_stats = {}
+        self.slowest_matches = []
+        self.over_budget = []
+        self.message = None
+        self.elapsed = 0.0
+        self.flagged = False
+        self.timed_patterns = {}
+
+    def start_message(self, commit_msg: str) -> None:
+        self.message = commit_msg
+        self.elapsed = 0.0
+        self.flagged = False
+
+    def budget_exhausted(self) -> bool:
+        """
+        return True if the patterns left for the current message should be skipped
+        """
+        return self.on_budget == "abort" and self.flagged
+
+    def search(self, category, pattern, commit_msg: str):
+        """
+        run pattern.search on commit_msg and record its time under category. In "abort" mode the search is stopped
+        when it runs past the budget left for the message and counts as not matching
+        """
+        if self.on_budget != "abort" or self.budget is None:
+            start = time.perf_counter()
+            matched = pattern.search(commit_msg)
+            self.record(category, commit_msg, time.perf_counter() - start)
+            return matched
+
+        timed_pattern = self.timed_pattern(pattern)
+        timeout = max(self.budget - self.elapsed, 0.0)
+        start = time.perf_counter()
+        try:
+            matched = timed_pattern.search(commit_msg, timeout=timeout)
+            seconds = time.perf_counter() - start
+        except TimeoutError:
+            matched = None
+            # counted past the budget even if the clock shows the timeout a hair early, so the message is flagged
+            seconds = max(time.perf_counter() - start, timeout + 1e-9)
+        self.record(category, commit_msg, seconds)
+        return matched
+
+    def timed_pattern(self, pattern):
+        """
+        return pattern compiled by the regex module, whose searches take a timeout
+        """
+        if pattern not in self.timed_patterns:
+            import regex
+
+            self.timed_patterns[pattern] = regex.compile(pattern.pattern, pattern.flags | regex.VERSION0)
+        return self.timed_patterns[pattern]
+
+    def record(self, category, commit_msg: str, seconds: float) -> None:
+        name = str(category)
+        stats = self.pattern_stats.setdefault(name, {"count": 0, "total_seconds": 0.0, "worst_seconds": 0.0,
+                                                     "worst_message": None})
+        stats["count"] += 1
+        stats["total_seconds"] += seconds
+        if seconds > stats["worst_seconds"]:
+            stats["worst_seconds"] = seconds
+            stats["worst_message"] = commit_msg
+
+        entry = (seconds, name, commit_msg)
+        if len(self.slowest_matches) < self.slowest:
+            heapq.heappush(self.slowest_matches, entry)
+        elif entry > self.slowest_matches[0]:
+            heapq.heapreplace(self.slowest_matches, entry)
+
+        self.elapsed += seconds
+        if self.budget is not None and not self.flagged and self.elapsed > self.budget:
+            self.flagged = True
+            self.over_budget.append({"message": commit_msg, "category": name, "elapsed_seconds": self.elapsed,
+                                     "aborted": self.on_budget == "abort"})
+
+    def report(self) -> dict:
+        patterns = sorted(
+            ({"category": name, **stats, "mean_seconds": stats["total_seconds"] / stats["count"]}
+             for name, stats in self.pattern_stats.items()),
+            key=lambda stats: stats["total_seconds"],
+            reverse=True,
+        )
+        slowest = [{"seconds": seconds, "category": name, "message": commit_msg}
+                   for seconds, name, commit_msg in sorted(self.slowest_matches, reverse=True)]
+        return {"budget_seconds": self.budget, "on_budget": self.on_budget, "patterns": patterns,
+                "slowest_matches": slowest, "over_budget": self.over_budget}
+
+    def export(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def pretty_print(self) -> None:
+        for stats in self.report()["patterns"]:
+            print("{:<32} count: {:>8}, total: {:.4f}s, mean: {:.1f}us, worst: {:.1f}us".format(
+                stats["category"], stats["count"], stats["total_seconds"], stats["mean_seconds"] * 1e6,
+                stats["worst_seconds"] * 1e6))
+        for entry in self.over_budget:
+            print("over budget ({:.4f}s at {}): {!r}".format(entry["elapsed_seconds"], entry["category"],
+                                                             entry["message"][:200]))
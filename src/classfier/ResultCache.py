@@ -0,0 +1,102 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+# number of keys per SELECT, below SQLite's limit of host parameters
+_QUERY_BATCH_SIZE = 500
+
+
+class ResultCache:
+    """
+    On-disk cache of classification results backed by SQLite. Entries are keyed by the SHA-1 of the raw message within
+    a namespace, which should fingerprint everything the result depends on (see pattern_fingerprint), so results of
+    other pattern sets are never served. Once the cache holds more than max_entries, the least recently used entries
+    of all namespaces are evicted
+    """
+
+    def __init__(self, path: str, namespace: str, max_entries: int = 1000000):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "namespace TEXT NOT NULL, key BLOB NOT NULL, result TEXT NOT NULL, last_used INTEGER NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self.conn.commit()
+
+    @staticmethod
+    def message_key(commit_msg: str) -> bytes:
+        return hashlib.sha1(commit_msg.encode("utf-8", "surrogatepass")).digest()
+
+    def get_many(self, commit_msgs: list[str]) -> dict:
+        """
+        return the cached (preprocessed, why_subcategory, what_subcategory) of every message found in the cache
+        """
+        keys = {self.message_key(commit_msg): commit_msg for commit_msg in commit_msgs}
+        key_lst = list(keys)
+        found = {}
+        for i in range(0, len(key_lst), _QUERY_BATCH_SIZE):
+            batch = key_lst[i:i + _QUERY_BATCH_SIZE]
+            rows = self.conn.execute(
+                "SELECT key, result FROM results WHERE namespace = ? AND key IN ({})".format(",".join("?" * len(batch))),
+                [self.namespace, *batch],
+            )
+            for key, result in rows:
+                preprocessed, why_subcategory, what_subcategory = json.loads(result)
+                found[keys[key]] = (preprocessed, why_subcategory, what_subcategory)
+        if found:
+            now = time.time_ns()
+            self.conn.executemany(
+                "UPDATE results SET last_used = ? WHERE namespace = ? AND key = ?",
+                [(now, self.namespace, self.message_key(commit_msg)) for commit_msg in found],
+            )
+            self.conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, records) -> None:
+        """
+        store an iterable of (commit_msg, (preprocessed, why_subcategory, what_subcategory)) and evict if needed
+        """
+        now = time.time_ns()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO results (namespace, key, result, last_used) VALUES (?, ?, ?, ?)",
+            [(self.namespace, self.message_key(commit_msg), json.dumps(result), now) for commit_msg, result in records],
+        )
+        self.conn.commit()
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        drop the least recently used entries beyond max_entries, return the number of entries removed
+        """
+        (size,) = self.conn.execute("SELECT COUNT(*) FROM results").fetchone()
+        excess = size - self.max_entries
+        if excess <= 0:
+            return 0
+        self.conn.execute(
+            "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY last_used LIMIT ?)", (excess,)
+        )
+        self.conn.commit()
+        return excess
+
+    def stats(self) -> dict:
+        (size,) = self.conn.execute("SELECT COUNT(*) FROM results WHERE namespace = ?", (self.namespace,)).fetchone()
+        return {"size": size, "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,183 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from classfier.ClassificationResults import CATEGORY_FACTORIES, ClassificationResults, TextColumn, \
+    category_positions, mask_dtype
+from classfier.CommitClassfier import create_classifier_pool, get_worker_classifier
+from util.ColumnarStore import decode_strings, encode_strings, read_string_column, write_dataset
+
+# A corpus is a columnar dataset (see util.ColumnarStore) with a single "message" column, plus:
+# - why_ids.npy and what_ids.npy: the position in WhyCategory / WhatCategory of the category of every message, -1 until
+#   it is classified. Workers write the ids of their spans into these files in place through memory maps
+# - preprocessed/<start>.data.npy and .offsets.npy: the preprocessed messages of the span starting at <start> as a
+#   byte arena, joined into preprocessed.data.npy and preprocessed.offsets.npy once every span is done
+MESSAGE_COLUMN = "message"
+UNCLASSIFIED = -1
+ID_FILES = {"why": "why_ids.npy", "what": "what_ids.npy"}
+PART_DIR = "preprocessed"
+PREPROCESSED_FILE = "preprocessed"
+
+
+class SharedCorpus:
+    """
+    Commit messages stored once on disk as a UTF-8 byte arena with offsets and memory-mapped read-only by every
+    process, so that a pool worker is only sent the path and the bounds of its span instead of pickled strings. The
+    workers write the category ids of their span into preallocated memory-mapped integer arrays and the preprocessed
+    messages into an arena of their own, so no results are pickled back either
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data, self.offsets, self.nulls = read_string_column(path, MESSAGE_COLUMN, mmap=True)
+
+    @classmethod
+    def create(cls, commit_msgs, path: str) -> "SharedCorpus":
+        """
+        write the messages of any iterable as a corpus at path
+        """
+        write_dataset(pd.DataFrame({MESSAGE_COLUMN: pd.Series(list(commit_msgs), dtype=object)}), path)
+        corpus = cls(path)
+        corpus.reset()
+        return corpus
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def reset(self) -> None:
+        """
+        allocate the id arrays, marking every message unclassified, and drop the preprocessed messages
+        """
+        for file_name in ID_FILES.values():
+            ids = np.lib.format.open_memmap(os.path.join(self.path, file_name), mode="w+", dtype=np.int8,
+                                            shape=(len(self),))
+            ids[:] = UNCLASSIFIED
+            ids.flush()
+            del ids
+        for suffix in (".data.npy", ".offsets.npy"):
+            file_path = os.path.join(self.path, PREPROCESSED_FILE + suffix)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        shutil.rmtree(os.path.join(self.path, PART_DIR), ignore_errors=True)
+        os.makedirs(os.path.join(self.path, PART_DIR))
+
+    def messages(self, start: int = 0, stop: int = None) -> list:
+        return decode_strings(self.data, self.offsets, self.nulls, start, stop)
+
+    def ids(self, dimension: str, mode: str = "r") -> np.ndarray:
+        """
+        return the memory-mapped category ids of dimension "why" or "what"; mode "r+" to write them
+        """
+        return np.load(os.path.join(self.path, ID_FILES[dimension]), mmap_mode=mode)
+
+    def spans(self, chunk_size: int) -> list[tuple]:
+        return [(self.path, start, min(start + chunk_size, len(self))) for start in range(0, len(self), chunk_size)]
+
+    def write_span(self, start: int, preprocessed_msgs: list[str], category_names: dict) -> None:
+        """
+        store the preprocessed messages and the why/what category names (keyed by dimension) of the span at start
+        """
+        for dimension, names in category_names.items():
+            positions = category_positions(CATEGORY_FACTORIES[dimension])
+            ids = self.ids(dimension, "r+")
+            ids[start:start + len(names)] = [positions[name] for name in names]
+            ids.flush()
+            del ids
+        data, offsets, _ = encode_strings(preprocessed_msgs)
+        part = os.path.join(self.path, PART_DIR, str(start))
+        np.save(part + ".data.npy", data)
+        np.save(part + ".offsets.npy", offsets)
+
+    def join_preprocessed(self) -> None:
+        """
+        join the preprocessed arenas of the spans into one, in message order
+        """
+        part_dir = os.path.join(self.path, PART_DIR)
+        starts = sorted(int(file_name.split(".")[0]) for file_name in os.listdir(part_dir)
+                        if file_name.endswith(".offsets.npy"))
+        datas = [np.zeros(0, dtype=np.uint8)]
+        offsets = [np.zeros(1, dtype=np.int64)]
+        n_bytes = n_msgs = 0
+        for start in starts:
+            if start != n_msgs:
+                raise ValueError("corpus {} misses the preprocessed messages {}:{}".format(self.path, n_msgs, start))
+            part = os.path.join(part_dir, str(start))
+            data = np.load(part + ".data.npy")
+            part_offsets = np.load(part + ".offsets.npy")
+            datas.append(data)
+            offsets.append(part_offsets[1:] + n_bytes)
+            n_bytes += len(data)
+            n_msgs += len(part_offsets) - 1
+        if n_msgs != len(self):
+            raise ValueError("corpus {} misses the preprocessed messages {}:{}".format(self.path, n_msgs, len(self)))
+        np.save(os.path.join(self.path, PREPROCESSED_FILE + ".data.npy"), np.concatenate(datas))
+        np.save(os.path.join(self.path, PREPROCESSED_FILE + ".offsets.npy"), np.concatenate(offsets))
+        shutil.rmtree(part_dir)
+        os.makedirs(part_dir)
+
+    def preprocessed_arena(self) -> tuple:
+        """
+        return the memory-mapped byte arena and offsets of the preprocessed messages
+        """
+        stem = os.path.join(self.path, PREPROCESSED_FILE)
+        return np.load(stem + ".data.npy", mmap_mode="r"), np.load(stem + ".offsets.npy", mmap_mode="r")
+
+    def preprocessed(self, start: int = 0, stop: int = None) -> list:
+        return decode_strings(*self.preprocessed_arena(), start=start, stop=stop)
+
+    def results(self, keep_text: bool = True) -> ClassificationResults:
+        """
+        return the results of a classified corpus; the text columns are views of the memory-mapped arenas
+        """
+        masks = {}
+        for dimension, category_factory in CATEGORY_FACTORIES.items():
+            ids = np.asarray(self.ids(dimension))
+            if (ids == UNCLASSIFIED).any():
+                raise ValueError("corpus {} is not fully classified".format(self.path))
+            masks[dimension] = np.left_shift(1, ids.astype(np.int64)).astype(mask_dtype(category_factory))
+        messages = preprocessed = None
+        if keep_text:
+            rows = np.arange(len(self), dtype=np.int32)
+            messages = TextColumn(rows, self.data, self.offsets, self.nulls)
+            preprocessed = TextColumn(rows, *self.preprocessed_arena())
+        return ClassificationResults(masks["why"], masks["what"], messages, preprocessed)
+
+
+def classify_corpus_span(span: tuple) -> int:
+    """
+    classify the messages start:stop of the corpus at path in a pool worker and write the results into the corpus.
+    Return the number of messages classified
+    """
+    path, start, stop = span
+    corpus = SharedCorpus(path)
+    classifier = get_worker_classifier()
+    preprocessed_msgs = [classifier.preprocess_message(commit_msg) for commit_msg in corpus.messages(start, stop)]
+    why_names, what_names = [], []
+    for commit_msg in preprocessed_msgs:
+        why_commit_categories, what_commit_categories = classifier.match_message(commit_msg)
+        why_names.append(why_commit_categories[0])
+        what_names.append(what_commit_categories[0])
+    corpus.write_span(start, preprocessed_msgs, {"why": why_names, "what": what_names})
+    return stop - start
+
+
+def classify_corpus(corpus: SharedCorpus, executor=None, workers: int = 1,
+                    chunk_size: int = 5000) -> ClassificationResults:
+    """
+    classify every message of a corpus, span by span in a process pool if an executor is given (see
+    create_classifier_pool) or workers > 1, and return the results
+    """
+    corpus.reset()
+    spans = corpus.spans(chunk_size)
+    if executor is None and workers <= 1:
+        for span in spans:
+            classify_corpus_span(span)
+    elif executor is None:
+        with create_classifier_pool(workers) as pool:
+            list(pool.map(classify_corpus_span, spans))
+    else:
+        list(executor.map(classify_corpus_span, spans))
+    corpus.join_preprocessed()
+    return corpus.results()
@@ -1,9 +1,14 @@
 import os
 import ast
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
 
-from classfier.CommitClassfier import CommitClassifier, WhyCategory, WhatCategory
+from classfier.CommitClassfier import CommitClassifier, WhyCategory, WhatCategory, create_classifier_pool, \
+    is_good_classified
+from util.ColumnarStore import read_dataset, write_dataset
+from util.CommitUtil import ensure_nltk_resources
 
 categories = ['why_category', 'why_subcategory', 'what_category', 'what_subcategory']
 
@@ -26,31 +31,54 @@ def preprocess_data(file_name: str) -> pd.DataFrame:
     return df
 
 
-def prepare_train_test_sets(train_file, test_file):
+def prepare_train_test_sets(train_file, test_file, columnar: bool = False):
+    """
+    write the cleaned train and test sets as test_set.xlsx and train_set.xlsx, or as the columnar datasets test_set
+    and train_set (see util.ColumnarStore) which keep the category lists as they are
+    """
     train_df = preprocess_data(train_file)
     test_df = preprocess_data(test_file)
-    test_df.to_excel('test_set.xlsx', index=False)
-    train_df.to_excel('train_set.xlsx', index=False)
+    if columnar:
+        write_dataset(test_df, 'test_set')
+        write_dataset(train_df, 'train_set')
+    else:
+        test_df.to_excel('test_set.xlsx', index=False)
+        train_df.to_excel('train_set.xlsx', index=False)
+
+
+def read_eval_set(file_name) -> pd.DataFrame:
+    """
+    read an eval set from a columnar dataset directory, or from an xlsx file whose category cells hold list literals
+    """
+    if os.path.isdir(file_name):
+        return read_dataset(file_name)
+    df = pd.read_excel(file_name, index_col=None)
+    for col in categories:
+        df[col] = df[col].apply(lambda x: ast.literal_eval(x))
+    return df
 
 
 def get_train_test_set(train_file, test_file):
-    train_df = pd.read_excel(train_file, index_col=None)
-    test_df = pd.read_excel(test_file, index_col=None)
-    train_df.iat[241, 4] = '+ Stock Photos Tools \nStock Photos Tools \nZoommy'
+    train_df = read_eval_set(train_file)
+    test_df = read_eval_set(test_file)
+    if not os.path.isdir(train_file):
+        train_df.iat[241, 4] = '+ Stock Photos Tools \nStock Photos Tools \nZoommy'
     assert not train_df['message'].isna().any()
-    for col in categories:
-        train_df[col] = train_df[col].apply(lambda x: ast.literal_eval(x))
-        test_df[col] = test_df[col].apply(lambda x: ast.literal_eval(x))
-    train_df['good'] = train_df.apply(lambda x: len(x.why_subcategory) != 0 and len(x.what_subcategory) != 0
-                                                and WhyCategory.MISSING.name not in x.why_subcategory
-                                                and WhatCategory.MISSING.name not in x.what_subcategory, axis=1)
-    test_df['good'] = test_df.apply(lambda x: len(x.why_subcategory) != 0 and len(x.what_subcategory) != 0
-                                              and WhyCategory.MISSING.name not in x.why_subcategory
-                                              and WhatCategory.MISSING.name not in x.what_subcategory, axis=1)
+    train_df['good'] = is_good_classified(train_df['why_subcategory'], train_df['what_subcategory'])
+    test_df['good'] = is_good_classified(test_df['why_subcategory'], test_df['what_subcategory'])
     print('train set size: {}, test set size: {}'.format(train_df.shape, test_df.shape))
     return train_df, test_df
 
 
+def convert_train_test_sets(train_file, test_file, train_path='train_set', test_path='test_set'):
+    """
+    convert the xlsx train and test sets into columnar datasets, with the fixes get_train_test_set applies
+    """
+    train_df, test_df = get_train_test_set(train_file, test_file)
+    write_dataset(train_df.drop(columns='good'), train_path)
+    write_dataset(test_df.drop(columns='good'), test_path)
+
+
 class ClassifierEvaluation:
     def __init__(self, train_data, test_data):
         self.train_data = train_data
@@ -60,32 +88,141 @@ class ClassifierEvaluation:
         self.train_results = None
         self.test_results = None
 
-    def classify(self):
+    def classify(self, workers: int = 1):
+        """
+        classify the train and test sets; with workers > 1 both sets are classified at the same time in one shared
+        process pool
+        """
         self.train_classifer = CommitClassifier(self.train_data['message'], False)
-        self.train_classifer.classify()
         self.test_classifer = CommitClassifier(self.test_data['message'], False)
-        self.test_classifer.classify()
+        if workers > 1:
+            with create_classifier_pool(workers) as pool, ThreadPoolExecutor(max_workers=2) as threads:
+                futures = [threads.submit(classifier.classify, pool)
+                           for classifier in (self.train_classifer, self.test_classifer)]
+                for future in futures:
+                    future.result()
+        else:
+            self.train_classifer.classify()
+            self.test_classifer.classify()
         self.train_results = self.train_classifer.get_results()
         self.test_results = self.test_classifer.get_results()
 
 
-def get_why_acc(results, ground_truth):
-    acc = []
-    for true_category, classified_category in zip(ground_truth['why_subcategory'], results['why_subcategory']):
-        acc.append(any(item in classified_category for item in true_category))
-    print('# of correctly labelled: {}, total: {}, acc: {}'.format(sum(acc), len(acc), sum(acc) / len(acc)))
-    return sum(acc) / len(acc)
+def encode_categories(category_lists, category_factory) -> np.ndarray:
+    """
+    encode a Series of category name lists as a boolean indicator matrix with one column per member of the category
+    enum, in enum order. Names that are not in the enum are left out
+    """
+    column_of = {category.name: i for i, category in enumerate(category_factory)}
+    exploded = pd.Series(list(category_lists), dtype=object).explode()
+    columns = exploded.map(column_of)
+    known = columns.notna().to_numpy()
+    indicators = np.zeros((len(category_lists), len(column_of)), dtype=bool)
+    indicators[exploded.index.to_numpy()[known], columns.to_numpy()[known].astype(int)] = True
+    return indicators
+
+
+def get_category_acc(results, ground_truth, column: str, category_factory, verbose: bool = True) -> float:
+    """
+    share of messages for which at least one ground-truth category was predicted
+    """
+    hits = (encode_categories(ground_truth[column], category_factory)
+            & encode_categories(results[column], category_factory)).any(axis=1)
+    if verbose:
+        print('# of correctly labelled: {}, total: {}, acc: {}'.format(hits.sum(), len(hits), hits.sum() / len(hits)))
+    return hits.sum() / len(hits)
+
+
+def get_why_acc(results, ground_truth, verbose: bool = True):
+    return get_category_acc(results, ground_truth, 'why_subcategory', WhyCategory, verbose)
+
+
+def get_what_acc(results, ground_truth, verbose: bool = True):
+    return get_category_acc(results, ground_truth, 'what_subcategory', WhatCategory, verbose)
+
+
+def _safe_divide(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros(np.broadcast(numerator, denominator).shape),
+                     where=denominator != 0)
+
+
+def _scores(tp, fp, fn):
+    precision = _safe_divide(tp, tp + fp)
+    recall = _safe_divide(tp, tp + fn)
+    f1 = _safe_divide(2 * precision * recall, precision + recall)
+    return precision, recall, f1
+
+
+def evaluate_categories(results, ground_truth, column: str, category_factory) -> pd.DataFrame:
+    """
+    per-category one-vs-rest confusion counts (TP, FP, FN, TN), precision, recall, F1 and support of the predicted
+    against the ground-truth categories. Scores with an empty denominator are 0
+    """
+    truth = encode_categories(ground_truth[column], category_factory)
+    pred = encode_categories(results[column], category_factory)
+    tp = (truth & pred).sum(axis=0)
+    fp = (~truth & pred).sum(axis=0)
+    fn = (truth & ~pred).sum(axis=0)
+    tn = len(truth) - tp - fp - fn
+    precision, recall, f1 = _scores(tp, fp, fn)
+    return pd.DataFrame({'TP': tp, 'FP': fp, 'FN': fn, 'TN': tn, 'precision': precision, 'recall': recall,
+                         'f1': f1, 'support': truth.sum(axis=0)},
+                        index=pd.Index([category.name for category in category_factory], name='category'))
+
+
+def get_confusion_matrix(results, ground_truth, column: str, category_factory) -> pd.DataFrame:
+    """
+    number of messages labelled with the row category in the ground truth and predicted as the column category
+    """
+    truth = encode_categories(ground_truth[column], category_factory).astype(np.int64)
+    pred = encode_categories(results[column], category_factory).astype(np.int64)
+    names = [category.name for category in category_factory]
+    return pd.DataFrame(truth.T @ pred, index=pd.Index(names, name='true'), columns=pd.Index(names, name='predicted'))
+
 
+def bootstrap_category_scores(results, ground_truth, column: str, category_factory, n_resamples: int = 1000,
+                              alpha: float = 0.05, batch_size: int = 100, seed: int = 0) -> pd.DataFrame:
+    """
+    bootstrap confidence intervals of the per-category precision, recall and F1 and of the accuracy. Each batch of
+    resamples is drawn as a matrix of multinomial row weights, so the confusion counts of the whole batch come from one
+    matrix product; batch_size bounds the memory to batch_size x number of messages
+    """
+    truth = encode_categories(ground_truth[column], category_factory)
+    pred = encode_categories(results[column], category_factory)
+    n = len(truth)
+    indicators = np.hstack([truth & pred, ~truth & pred, truth & ~pred,
+                            (truth & pred).any(axis=1, keepdims=True)]).astype(np.int64)
+    k = truth.shape[1]
+    rng = np.random.default_rng(seed)
+    counts = []
+    for start in range(0, n_resamples, batch_size):
+        weights = rng.multinomial(n, np.full(n, 1 / n), size=min(batch_size, n_resamples - start))
+        counts.append(weights @ indicators)
+    counts = np.vstack(counts)
+    tp, fp, fn = counts[:, :k], counts[:, k:2 * k], counts[:, 2 * k:3 * k]
+    precision, recall, f1 = _scores(tp, fp, fn)
+    acc = counts[:, 3 * k] / n
 
-def get_what_acc(results, ground_truth):
-    acc = []
-    for true_category, classified_category in zip(ground_truth['what_subcategory'], results['what_subcategory']):
-        acc.append(any(item in classified_category for item in true_category))
-    print('# of correctly labelled: {}, total: {}, acc: {}'.format(sum(acc), len(acc), sum(acc) / len(acc)))
-    return sum(acc) / len(acc)
+    estimates = evaluate_categories(results, ground_truth, column, category_factory)
+    rows = []
+    for metric, samples in (('precision', precision), ('recall', recall), ('f1', f1)):
+        lower, upper = np.quantile(samples, [alpha / 2, 1 - alpha / 2], axis=0)
+        for i, category in enumerate(category_factory):
+            rows.append((category.name, metric, estimates[metric].iloc[i], lower[i], upper[i]))
+    lower, upper = np.quantile(acc, [alpha / 2, 1 - alpha / 2])
+    rows.append(('all', 'acc', (truth & pred).any(axis=1).mean(), lower, upper))
+    return pd.DataFrame(rows, columns=['category', 'metric', 'estimate', 'lower', 'upper'])
 
 
-def get_binary_evaluation(true_labels, pred_labels):
+def get_binary_evaluation(true_labels, pred_labels, verbose: bool = True) -> dict:
+    """
+    confusion counts, accuracy, precision, recall and F1 of binary labels. Scores with an empty denominator are 0,
+    e.g. the F1 of predictions without any true positive
+    """
+    true_labels = np.asarray(true_labels)
+    pred_labels = np.asarray(pred_labels)
     # True Positive (TP): we predict a label of 1 (positive), and the true label is 1.
     TP = np.sum(np.logical_and(pred_labels == 1, true_labels == 1))
     # True Negative (TN): we predict a label of 0 (negative), and the true label is 0.
@@ -94,20 +231,28 @@ def get_binary_evaluation(true_labels, pred_labels):
     FP = np.sum(np.logical_and(pred_labels == 1, true_labels == 0))
     # False Negative (FN): we predict a label of 0 (negative), but the true label is 1.
     FN = np.sum(np.logical_and(pred_labels == 0, true_labels == 1))
-    print('TP: %i, FP: %i, TN: %i, FN: %i' % (TP, FP, TN, FN))
+    if verbose:
+        print('TP: %i, FP: %i, TN: %i, FN: %i' % (TP, FP, TN, FN))
 
-    acc = (TP + TN) / (TP + TN + FP + FN)
-    precision = TP / (TP + FP)
-    recall = TP / (TP + FN)
-    f1 = 2 * (precision * recall / (precision + recall))
-    print('Binary Classification - Accuracy: {}, Precision: {}, Recall: {}, F1:{}'.format(acc, precision, recall, f1))
+    acc = _safe_divide(TP + TN, TP + TN + FP + FN)
+    precision, recall, f1 = _scores(TP, FP, FN)
+    if verbose:
+        print('Binary Classification - Accuracy: {}, Precision: {}, Recall: {}, F1:{}'.format(acc, precision, recall,
+                                                                                              f1))
+    return {'TP': int(TP), 'FP': int(FP), 'TN': int(TN), 'FN': int(FN), 'accuracy': float(acc),
+            'precision': float(precision), 'recall': float(recall), 'f1': float(f1)}
 
 
 if __name__ == '__main__':
+    ensure_nltk_resources(download=True)
     os.chdir('../../data/eval')
     #prepare_train_test_sets('train_set.csv', 'test_set.csv')
     #train_df, test_df = get_train_test_set('train_set.xlsx', 'to_fix_defects.xlsx')
-    train_df, test_df = get_train_test_set('train_set.xlsx', 'test_set.xlsx')
+    #convert_train_test_sets('train_set.xlsx', 'test_set.xlsx')
+    if os.path.isdir('train_set') and os.path.isdir('test_set'):
+        train_df, test_df = get_train_test_set('train_set', 'test_set')
+    else:
+        train_df, test_df = get_train_test_set('train_set.xlsx', 'test_set.xlsx')
     classifer_evaluation = ClassifierEvaluation(train_df, test_df)
     classifer_evaluation.classify()
     acc_train = get_why_acc(classifer_evaluation.train_results, classifer_evaluation.train_data)
@@ -117,3 +262,7 @@ if __name__ == '__main__':
 
     get_binary_evaluation(train_df['good'], classifer_evaluation.train_results['good_classified'])
     get_binary_evaluation(test_df['good'], classifer_evaluation.test_results['good_classified'])
+    print(evaluate_categories(classifer_evaluation.test_results, classifer_evaluation.test_data, 'why_subcategory',
+                              WhyCategory))
+    print(bootstrap_category_scores(classifer_evaluation.test_results, classifer_evaluation.test_data,
+                                    'why_subcategory', WhyCategory))
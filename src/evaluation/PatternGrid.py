@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from classfier.CommitClassfier import (
+    CATEGORY_REQUIREMENTS,
+    PATTERN_DIR,
+    CommitClassifier,
+    KeywordIndex,
+    Keywords,
+    WhatCategory,
+    WhyCategory,
+    category_key,
+    category_pattern_files,
+    get_category_matcher,
+    install_patterns,
+    load_keyword_list,
+    reload_patterns,
+)
+from evaluation.ClassiferEvaluation import get_binary_evaluation, get_train_test_set, get_what_acc, get_why_acc
+from project_path import ROOT_DIR
+from util.CommitUtil import ensure_nltk_resources
+
+EVAL_DIR = os.path.join(ROOT_DIR, "data/eval")
+CATEGORY_FACTORIES = (WhyCategory, WhatCategory)
+
+
+class PatternVariant(namedtuple("PatternVariant", "name keywords regex_exps")):
+    """
+    A set of pattern changes to evaluate: keywords replaces the keyword lists of data/pattern files (keyed by file
+    name), regex_exps replaces the expanded patterns of categories (keyed by category_key). Everything else stays as
+    it is
+    """
+
+    def __new__(cls, name: str, keywords: dict = None, regex_exps: dict = None):
+        return super().__new__(cls, name, keywords or {}, regex_exps or {})
+
+
+def keyword_files() -> list[str]:
+    """
+    return the names of the data/pattern files the categories and the keyword requirements are built from
+    """
+    sources = [source for category_factory in CATEGORY_FACTORIES for category in category_factory
+               for source in category.sources]
+    sources += [source for groups in CATEGORY_REQUIREMENTS.values() for group in groups for source in group]
+    return sorted({os.path.relpath(source.file, PATTERN_DIR) for source in sources if isinstance(source, Keywords)})
+
+
+def base_keywords() -> dict:
+    """
+    return the current keyword lists of all pattern files, read from disk
+    """
+    reload_patterns()
+    return {file_name: list(load_keyword_list(PATTERN_DIR + file_name)) for file_name in keyword_files()}
+
+
+def keyword_ablations(keywords: dict, file_names: list[str] = None) -> list[PatternVariant]:
+    """
+    return one variant per keyword of the given files (all by default) that leaves that keyword out
+    """
+    return [PatternVariant("-{}:{}".format(file_name, keyword),
+                           {file_name: [other for other in keywords[file_name] if other != keyword]})
+            for file_name in (file_names or sorted(keywords)) for keyword in keywords[file_name]]
+
+
+def variant_from_dict(d: dict, keywords: dict) -> PatternVariant:
+    """
+    return a variant from its JSON form: a name, keyword lists to "add" to and "remove" from files, full "keywords"
+    lists and "regex_exps" by category key
+    """
+    overrides = {file_name: list(file_keywords) for file_name, file_keywords in d.get("keywords", {}).items()}
+    for file_name, added in d.get("add", {}).items():
+        current = overrides.get(file_name, keywords[file_name])
+        overrides[file_name] = current + [keyword for keyword in added if keyword not in current]
+    for file_name, removed in d.get("remove", {}).items():
+        overrides[file_name] = [keyword for keyword in overrides.get(file_name, keywords[file_name])
+                                if keyword not in removed]
+    unknown = set(overrides) - set(keywords)
+    if unknown:
+        raise ValueError("variant {} changes unknown pattern files: {}".format(d["name"], sorted(unknown)))
+    return PatternVariant(d["name"], overrides, d.get("regex_exps"))
+
+
+def install_variant(variant: PatternVariant, keywords: dict) -> None:
+    """
+    make the classifier use the patterns of a variant. Categories whose expanded pattern is replaced are not
+    prefiltered by the keyword index, since their required keywords may no longer hold
+    """
+    categories = {category_key(category): category for category_factory in CATEGORY_FACTORIES
+                  for category in category_factory}
+    regex_exps = {categories[key]: regex_exp for key, regex_exp in variant.regex_exps.items()}
+    keyword_lists = {PATTERN_DIR + file_name: file_keywords
+                     for file_name, file_keywords in {**keywords, **variant.keywords}.items()}
+    install_patterns(keyword_lists, regex_exps, None)
+    if regex_exps:
+        # built after the keyword lists are installed, since the index reads them
+        keyword_index = KeywordIndex({category: groups for category, groups in CATEGORY_REQUIREMENTS.items()
+                                      if category not in regex_exps})
+        install_patterns(keyword_lists, regex_exps, keyword_index)
+
+
+def changed_categories(variant: PatternVariant) -> list:
+    """
+    return the categories whose pattern a variant changes: the ones it replaces and the ones built from the keyword
+    files it replaces
+    """
+    changed_files = {PATTERN_DIR + file_name for file_name in variant.keywords}
+    return [category for category_factory in CATEGORY_FACTORIES for category in category_factory
+            if category_key(category) in variant.regex_exps or category_pattern_files(category) & changed_files]
+
+
+class EvalSet(namedtuple("EvalSet", "preprocessed codes truth")):
+    """
+    An eval set preprocessed once: the distinct preprocessed messages, the position of every message among them and
+    the ground truth (why_subcategory, what_subcategory and good)
+    """
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "EvalSet":
+        codes, unique_msgs = pd.factorize(df["message"])
+        classifier = CommitClassifier([])
+        preprocessed = pd.Series([classifier.preprocess_message(commit_msg) for commit_msg in unique_msgs],
+                                 dtype=object)
+        return cls(preprocessed, codes, df[["why_subcategory", "what_subcategory", "good"]].reset_index(drop=True))
+
+    def search(self, categories) -> dict:
+        """
+        return whether the installed pattern of each category matches each distinct message
+        """
+        return {category: get_category_matcher(type(category)).search_series(self.preprocessed, category)
+                for category in categories if category is not type(category).MISSING}
+
+    def classify(self, matches: dict) -> pd.DataFrame:
+        """
+        return the results of the messages in the format of get_results() from the matches of every category (see
+        search), picking the last matching category of each enum as CategoryMatcher does
+        """
+        names = {}
+        for category_factory in CATEGORY_FACTORIES:
+            members = list(category_factory)
+            ids = np.full(len(self.preprocessed), members.index(category_factory.MISSING))
+            for position, category in enumerate(members):
+                if category in matches:
+                    ids[matches[category]] = position
+            names[category_factory] = np.array([category.name for category in members], dtype=object)[ids][self.codes]
+        why_names, what_names = names[WhyCategory], names[WhatCategory]
+        return pd.DataFrame({
+            "why_subcategory": [[name] for name in why_names],
+            "what_subcategory": [[name] for name in what_names],
+            "good_classified": (why_names != WhyCategory.MISSING.name) & (what_names != WhatCategory.MISSING.name),
+        })
+
+    def evaluate(self, matches: dict) -> dict:
+        results = self.classify(matches)
+        binary = get_binary_evaluation(self.truth["good"], results["good_classified"], verbose=False)
+        return {"why_acc": get_why_acc(results, self.truth, verbose=False),
+                "what_acc": get_what_acc(results, self.truth, verbose=False),
+                "binary_acc": binary["accuracy"], "binary_f1": binary["f1"]}
+
+
+_grid_keywords = None
+_grid_eval_sets = None
+_grid_matches = None
+
+
+def init_grid_worker(keywords: dict, eval_sets: dict) -> None:
+    """
+    keep the base keyword lists and the preprocessed eval sets in a worker, so that only variants are sent to it, and
+    match every unchanged pattern once
+    """
+    global _grid_keywords, _grid_eval_sets, _grid_matches
+    _grid_keywords = keywords
+    _grid_eval_sets = eval_sets
+    install_variant(PatternVariant("baseline"), keywords)
+    _grid_matches = {set_name: eval_set.search(category for category_factory in CATEGORY_FACTORIES
+                                               for category in category_factory)
+                     for set_name, eval_set in eval_sets.items()}
+
+
+def evaluate_variant(variant: PatternVariant) -> dict:
+    """
+    evaluate a variant on every eval set of the worker, return one table row. Only the patterns the variant changes
+    are matched again
+    """
+    changed = changed_categories(variant)
+    if changed:
+        install_variant(variant, _grid_keywords)
+    row = {"variant": variant.name}
+    for set_name, eval_set in _grid_eval_sets.items():
+        matches = {**_grid_matches[set_name], **eval_set.search(changed)}
+        for metric, value in eval_set.evaluate(matches).items():
+            row["{}_{}".format(set_name, metric)] = value
+    return row
+
+
+def evaluate_variants(variants: list[PatternVariant], eval_sets: dict, keywords: dict = None, workers: int = 1,
+                      chunk_size: int = 4) -> pd.DataFrame:
+    """
+    evaluate the unchanged patterns and every variant on eval sets preprocessed once (see EvalSet), in a process pool
+    with workers > 1. Return a table with one row per variant of the why/what accuracy and the binary accuracy and F1
+    on every eval set, plus the change of each against the unchanged patterns
+    """
+    keywords = base_keywords() if keywords is None else keywords
+    variants = [PatternVariant("baseline")] + list(variants)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_grid_worker,
+                                 initargs=(keywords, eval_sets)) as pool:
+            rows = list(pool.map(evaluate_variant, variants, chunksize=chunk_size))
+    else:
+        init_grid_worker(keywords, eval_sets)
+        try:
+            rows = [evaluate_variant(variant) for variant in variants]
+        finally:
+            reload_patterns()
+    table = pd.DataFrame(rows).set_index("variant")
+    return table.join((table - table.iloc[0]).add_prefix("delta_"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="evaluate pattern variants on the train and test sets")
+    parser.add_argument("--variants", help="JSON file with a list of variants (see variant_from_dict)")
+    parser.add_argument("--ablate", nargs="*", metavar="FILE",
+                        help="add one variant per keyword of these pattern files (all if none are given) leaving it out")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--sort", default="test_binary_f1", help="column to sort the table by")
+    parser.add_argument("--output", help="CSV file to write the table to")
+    args = parser.parse_args()
+
+    ensure_nltk_resources(download=True)
+    os.chdir(EVAL_DIR)
+    if os.path.isdir("train_set") and os.path.isdir("test_set"):
+        train_df, test_df = get_train_test_set("train_set", "test_set")
+    else:
+        train_df, test_df = get_train_test_set("train_set.xlsx", "test_set.xlsx")
+    eval_sets = {"train": EvalSet.from_frame(train_df), "test": EvalSet.from_frame(test_df)}
+
+    keywords = base_keywords()
+    variants = []
+    if args.variants:
+        with open(args.variants) as f:
+            variants += [variant_from_dict(d, keywords) for d in json.load(f)]
+    if args.ablate is not None:
+        variants += keyword_ablations(keywords, args.ablate or None)
+
+    table = evaluate_variants(variants, eval_sets, keywords, args.workers)
+    table = table.sort_values(args.sort, ascending=False, kind="stable")
+    with pd.option_context("display.max_rows", None, "display.max_columns", None, "display.width", 250):
+        print(table)
+    if args.output:
+        table.to_csv(args.output)
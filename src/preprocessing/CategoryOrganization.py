@@ -1,6 +1,6 @@
 import os.path
 import pandas as pd
-from pandas import DataFrame
+from pandas import DataFrame, Series
 
 LANGUAGE_COL_NAME = "language"
 ID_COL_NAME = "id"
@@ -34,6 +34,22 @@ def join_column(x) -> str:
     )
 
 
+def join_columns(df: DataFrame) -> Series:
+    """
+    Vectorized join_column over the rows of df
+    """
+    joined = pd.Series("", index=df.index, dtype=object)
+    for col in df.columns:
+        joined = joined + df[col].where(df[col].isna(), df[col].astype(str)).fillna("")
+    return (
+        joined.str.strip()
+        .str.replace("/", "+", regex=False)
+        .str.replace(";", "+", regex=False)
+        .str.replace(" ", "_", regex=False)
+        .str.lower()
+    )
+
+
 def get_finalize_dataFrame(
         df: DataFrame, language: str, category_start_index=4
 ) -> DataFrame:
@@ -43,70 +59,73 @@ def get_finalize_dataFrame(
     """
     finalized_df = df[["id", "message"]].copy()
     for category_col in CATEGORY_COLUMN:
-        finalized_df[category_col] = df[
-            df.columns[category_start_index: category_start_index + 2]
-        ].apply(join_column, axis=1)
+        finalized_df[category_col] = join_columns(
+            df[df.columns[category_start_index: category_start_index + 2]]
+        )
         category_start_index += 2
     return finalized_df
 
 
-def appendDFToDict(col2df: dict, file: DataFrame, category: str) -> None:
+def find_sub_dataFrame(file: DataFrame) -> dict:
     """
-    partition df into small pieces based on category value and append to saved dict
+    partition a file into different pieces based on its column value: a row belongs to the piece of every value it has
+    in one of the CATEGORY_COLUMN, once, and the pieces keep the row order of file
     """
-    category_name_set = set(file[category].tolist())
-
-    for category_name in category_name_set:
-        if category_name not in col2df:
-            col2df[category_name] = file.loc[file[category] == category_name]
-        else:
-            concate_to_res(
-                col2df[category_name], file.loc[file[category] == category_name]
-            )
-
-
-def find_sub_dataFrame(file: DataFrame) -> dict:
+    positions = pd.Series(range(len(file)), index=file.index)
+    melted = pd.DataFrame({
+        "position": pd.concat([positions] * len(CATEGORY_COLUMN), ignore_index=True),
+        "category": pd.concat([file[category] for category in CATEGORY_COLUMN], ignore_index=True),
+    }).drop_duplicates().sort_values("position", kind="stable")
+    return {
+        category_name: file.iloc[group["position"].to_numpy()]
+        for category_name, group in melted.groupby("category", sort=False)
+    }
+
+
+class CategoryWriter:
     """
-    partition a file into different pieces based on its column value
+    Streaming writer of the per category csv files: the first piece written for a category creates its file with a
+    header, later pieces are appended to it
     """
-    col2df: dict = {}
-    for category in CATEGORY_COLUMN:
-        appendDFToDict(col2df, file, category)
-    return col2df
 
+    def __init__(self, category_path: str = CATEGORY_PATH):
+        self.category_path = category_path
+        self.files = {}
 
-def concate_to_res(col_dict: DataFrame, file: DataFrame) -> DataFrame:
-    return pd.concat([col_dict, file])
+    def write(self, category_name: str, df: DataFrame) -> None:
+        if category_name not in self.files:
+            self.files[category_name] = open(
+                os.path.join(self.category_path, "{}_commit.csv".format(category_name)), "w", newline=""
+            )
+            df.to_csv(self.files[category_name], index=False)
+        else:
+            df.to_csv(self.files[category_name], index=False, header=False)
 
+    def close(self) -> None:
+        for f in self.files.values():
+            f.close()
+        self.files = {}
 
-if __name__ == "__main__":
-    os.chdir('../../data/labelled')
-    files = ['{}.csv'.format(lan) for lan in languages]
-    raw_dfs: list = [pd.read_csv(file) for file in files]
-
-    finalized_dfs: list = [
-        get_finalize_dataFrame(file, language)
-        for file, language in zip(raw_dfs, languages)
-    ]
-
-    for df, language in zip(finalized_dfs, languages):
-        df.to_csv(
-            os.path.join(FINALIZED_PATH, "finalized_{}.csv".format(language)),
-            index=False,
-        )
+    def __enter__(self):
+        return self
 
-    # each key-value pair represent category value to the dataframe that contains the rows with that category
-    category_to_row: dict = {}
+    def __exit__(self, *exc_info):
+        self.close()
 
-    for df in finalized_dfs:
-        file_for_col = find_sub_dataFrame(df)
-        for col, sub_df in file_for_col.items():
-            if col not in category_to_row:
-                category_to_row[col] = sub_df
-            else:
-                category_to_row[col] = concate_to_res(category_to_row[col], sub_df)
 
-    for col, sheet_df in category_to_row.items():
-        sheet_df.to_csv(
-            os.path.join(CATEGORY_PATH, "{}_commit.csv".format(col)), index=False
-        )
+if __name__ == "__main__":
+    os.chdir('../../data/labelled')
+    os.makedirs(FINALIZED_PATH, exist_ok=True)
+    os.makedirs(CATEGORY_PATH, exist_ok=True)
+
+    # each language is finalized, saved and partitioned by category value in one pass, every piece is appended to the
+    # file of its category
+    with CategoryWriter() as writer:
+        for language in languages:
+            df = get_finalize_dataFrame(pd.read_csv("{}.csv".format(language)), language)
+            df.to_csv(
+                os.path.join(FINALIZED_PATH, "finalized_{}.csv".format(language)),
+                index=False,
+            )
+            for col, sub_df in find_sub_dataFrame(df).items():
+                writer.write(col, sub_df)
@@ -1,6 +1,32 @@
+import csv
+import heapq
 import os
+import shutil
+import sys
+import tempfile
+from typing import Iterator
+
+import numpy as np
 import pandas as pd
 
+GITHUB_URL = "https://github.com/"
+RAW_COLUMNS = ["msg", "repo", "sha"]
+SHARD_COLUMNS = ["id", "msg", "origin_diff_link", "repo", "sha"]
+# upper bounds (exclusive) of the message lengths of the shards, the last shard takes all longer messages
+LENGTH_BUCKETS = [32, 64, 128, 256, 512, 1024]
+# number of sorted runs merged at once, so that the number of open files stays bounded
+MERGE_FAN_IN = 128
+
+# messages can be longer than the default field limit of the csv module
+csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+
+def origin_diff_links(repos: pd.Series, shas: pd.Series) -> pd.Series:
+    """
+    return the GitHub commit links of the given repos ("owner/name") and commit SHAs
+    """
+    return GITHUB_URL + repos.astype(str) + "/commit/" + shas.astype(str)
+
 
 def sort_and_add_link(path):
     """
@@ -10,10 +36,7 @@ def sort_and_add_link(path):
     # randomly sample 100 java commit messages: df = df.sample(frac=0.5, replace=False)
     df = df.sort_index()
     df["id"] = df.index
-    df["origin_diff_link"] = df.apply(
-        lambda x: r"https://github.com/" + x["repo"] + r"/commit/" + x["sha"],
-        axis="columns",
-    )
+    df["origin_diff_link"] = origin_diff_links(df["repo"], df["sha"])
     # use a lambda expression to sort
     df.sort_values("msg", key=lambda x: x.str.len(), inplace=True)
     df[["id", "msg", "origin_diff_link", "repo", "sha"]].to_excel(
@@ -21,7 +44,127 @@ def sort_and_add_link(path):
     )
 
 
+def read_raw_chunks(path: str, chunk_size: int = 100000) -> Iterator[pd.DataFrame]:
+    """
+    read a raw dump chunk by chunk, keeping the columns msg, repo and sha and the index as id. CSV (with an id column
+    or the row number as id) and JSONL dumps are streamed; a pickle can only be loaded whole and is sliced into chunks
+    after the other columns (such as the diffs) have been dropped
+    """
+    if path.endswith(".csv"):
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = RAW_COLUMNS + (["id"] if "id" in header else [])
+        chunks = pd.read_csv(path, usecols=usecols, dtype=str, keep_default_na=False, chunksize=chunk_size)
+    elif path.endswith(".jsonl"):
+        chunks = (chunk[RAW_COLUMNS + (["id"] if "id" in chunk.columns else [])]
+                  for chunk in pd.read_json(path, lines=True, dtype=False, chunksize=chunk_size))
+    else:
+        df = pd.read_pickle(path)[RAW_COLUMNS].sort_index()
+        chunks = (df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size))
+    for chunk in chunks:
+        chunk = chunk.copy()
+        if "id" not in chunk.columns:
+            chunk["id"] = chunk.index
+        yield chunk
+
+
+def write_run(df: pd.DataFrame, path: str) -> None:
+    """
+    write a sorted run with the csv module, which quotes every field with a line break (to_csv leaves a bare "\\r"
+    unquoted, so read_run would split the row)
+    """
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["length", "seq"] + SHARD_COLUMNS)
+        writer.writerows(df[["length", "seq"] + SHARD_COLUMNS].fillna("").itertuples(index=False, name=None))
+
+
+def read_run(path: str) -> Iterator[tuple]:
+    """
+    yield the rows of a sorted run as ((length, seq), row) with row in SHARD_COLUMNS order
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            yield (int(row[0]), int(row[1])), row[2:]
+
+
+def merge_runs(run_paths: list[str], out_path: str, header: list[str], with_keys: bool,
+               batch_size: int = 10000) -> None:
+    """
+    merge sorted runs into one file, writing batch_size rows at a time; with_keys keeps the sort keys in the output so
+    that it can be merged again
+    """
+    with open(out_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        batch = []
+        for (length, seq), row in heapq.merge(*(read_run(path) for path in run_paths), key=lambda item: item[0]):
+            batch.append([length, seq, *row] if with_keys else row)
+            if len(batch) == batch_size:
+                writer.writerows(batch)
+                batch = []
+        writer.writerows(batch)
+
+
+def bucket_name(bucket: int, bounds: list[int]) -> str:
+    lower = 0 if bucket == 0 else bounds[bucket - 1]
+    return "len{}-{}".format(lower, bounds[bucket] - 1) if bucket < len(bounds) else "len{}+".format(lower)
+
+
+def shard_raw_corpus(path: str, out_dir: str, chunk_size: int = 100000, bounds: list[int] = None,
+                     tmp_dir: str = None) -> dict:
+    """
+    convert a raw dump into CSV shards by message length, each sorted by message length (ties in input order) with the
+    columns of sort_and_add_link. The dump is read chunk by chunk; every chunk is split by length bucket, sorted and
+    written as a run, and the runs of each bucket are then merged MERGE_FAN_IN at a time, so memory stays bounded by
+    chunk_size. Return the number of messages of every shard file
+    """
+    bounds = LENGTH_BUCKETS if bounds is None else bounds
+    name = os.path.splitext(os.path.basename(path))[0]
+    os.makedirs(out_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(dir=tmp_dir)
+    runs = {}
+    counts = {}
+    seq = 0
+    try:
+        for chunk in read_raw_chunks(path, chunk_size):
+            chunk["origin_diff_link"] = origin_diff_links(chunk["repo"], chunk["sha"])
+            chunk["length"] = chunk["msg"].astype(str).str.len().to_numpy()
+            chunk["seq"] = np.arange(seq, seq + len(chunk))
+            seq += len(chunk)
+            buckets = np.searchsorted(bounds, chunk["length"].to_numpy(), side="right")
+            for bucket, part in chunk.groupby(buckets, sort=True):
+                part = part.sort_values(["length", "seq"], kind="stable")
+                run_path = os.path.join(work_dir, "{}_{}.csv".format(bucket, len(runs.get(bucket, []))))
+                write_run(part, run_path)
+                runs.setdefault(bucket, []).append(run_path)
+                counts[bucket] = counts.get(bucket, 0) + len(part)
+
+        shards = {}
+        for bucket, run_paths in sorted(runs.items()):
+            generation = 0
+            while len(run_paths) > MERGE_FAN_IN:
+                merged = []
+                for start in range(0, len(run_paths), MERGE_FAN_IN):
+                    merged_path = os.path.join(work_dir, "{}_merged{}_{}.csv".format(bucket, generation, start))
+                    merge_runs(run_paths[start:start + MERGE_FAN_IN], merged_path, ["length", "seq"] + SHARD_COLUMNS,
+                               True)
+                    merged.append(merged_path)
+                for run_path in run_paths:
+                    os.remove(run_path)
+                run_paths = merged
+                generation += 1
+            shard_path = os.path.join(out_dir, "{}_{}.csv".format(name, bucket_name(bucket, bounds)))
+            merge_runs(run_paths, shard_path, SHARD_COLUMNS, False)
+            shards[shard_path] = counts[bucket]
+        return shards
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
 if __name__ == "__main__":
     os.chdir("../../data/raw")
     path = r"./mcmd_javascript_100.pkl"
     sort_and_add_link(path)
+    # full dumps: shard_raw_corpus(path, "../sharded")
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import tempfile
+import time
+import warnings
+from typing import Iterator
+
+import pandas as pd
+
+from classfier.CommitClassfier import CommitClassifier, build_results
+from preprocessing.CommitMessagePreprocessor import origin_diff_links
+
+# git log -z ends every commit with a NUL; the fields of a commit are separated by newlines and the message comes last
+LOG_FORMAT = "%H%n%P%n%cI%n%B"
+REMOTE_PATTERN = re.compile(r"[:/]([^/:]+/[^/]+?)(?:\.git)?/?$")
+GITHUB_REMOTE_PATTERN = re.compile(r"github\.com[:/]([^/:]+/[^/]+?)(?:\.git)?/?$")
+
+
+def git(repo_path: str, *args: str) -> str:
+    return subprocess.run(["git", "-C", repo_path, *args], capture_output=True, text=True, check=True).stdout
+
+
+def remote_url(repo_path: str) -> str:
+    """
+    return the URL of the origin remote of a repository, or None if it has none
+    """
+    try:
+        return git(repo_path, "remote", "get-url", "origin").strip() or None
+    except subprocess.CalledProcessError:
+        return None
+
+
+def repo_name(repo_path: str) -> str:
+    """
+    return the "owner/name" of the origin remote of a repository, or its directory name if it has none
+    """
+    url = remote_url(repo_path)
+    match = REMOTE_PATTERN.search(url) if url else None
+    return match.group(1) if match else os.path.basename(os.path.abspath(repo_path))
+
+
+def is_github_repo(repo_path: str) -> bool:
+    url = remote_url(repo_path)
+    return bool(url and GITHUB_REMOTE_PATTERN.search(url))
+
+
+def has_commits(repo_path: str) -> bool:
+    return subprocess.run(["git", "-C", repo_path, "rev-parse", "--verify", "-q", "HEAD"],
+                          capture_output=True).returncode == 0
+
+
+def is_ancestor(repo_path: str, sha: str) -> bool:
+    return subprocess.run(["git", "-C", repo_path, "merge-base", "--is-ancestor", sha, "HEAD"],
+                          capture_output=True).returncode == 0
+
+
+def parse_commit(record: bytes) -> tuple:
+    sha, parents, commit_time, msg = record.decode("utf-8", "replace").split("\n", 3)
+    return sha, parents.split(), commit_time, msg.strip()
+
+
+def iter_commits(repo_path: str, since: str = None, batch_size: int = 1000) -> Iterator[pd.DataFrame]:
+    """
+    stream the commits reachable from HEAD, excluding since and its ancestors, as DataFrames of at most batch_size rows
+    with the columns sha, parents (a list of SHAs), time and msg. Parents always come before their children, whatever
+    the commit times say. git log is read as it runs, so only one batch is held in memory; its stderr goes to a
+    temporary file, which cannot fill up and stall git the way an unread pipe would
+    """
+    if not has_commits(repo_path):
+        return
+    revision = "{}..HEAD".format(since) if since else "HEAD"
+    columns = ["sha", "parents", "time", "msg"]
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(["git", "-C", repo_path, "log", "-z", "--topo-order", "--reverse",
+                                    "--format=" + LOG_FORMAT, revision],
+                                   stdout=subprocess.PIPE, stderr=stderr_file)
+        records = []
+        pending = b""
+        try:
+            while True:
+                chunk = process.stdout.read(1 << 16)
+                if not chunk:
+                    break
+                *complete, pending = (pending + chunk).split(b"\0")
+                for record in complete:
+                    records.append(parse_commit(record))
+                    if len(records) == batch_size:
+                        yield pd.DataFrame(records, columns=columns)
+                        records = []
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+        if returncode != 0:
+            stderr_file.seek(0)
+            raise RuntimeError("git log failed in {}: {}".format(
+                repo_path, stderr_file.read().decode("utf-8", "replace").strip()))
+    if pending.strip(b"\n"):
+        records.append(parse_commit(pending))
+    if records:
+        yield pd.DataFrame(records, columns=columns)
+
+
+class WatermarkStore:
+    """
+    JSON file with the ingestion state of every repository, keyed by the absolute path of the repository: a commit
+    whose ancestors have all been ingested (sha), the commits ingested beyond it (ingested) and the number of commits
+    ingested so far
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.watermarks = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.watermarks = json.load(f)
+
+    @staticmethod
+    def key(repo_path: str) -> str:
+        return os.path.abspath(repo_path)
+
+    def get(self, repo_path: str) -> str:
+        watermark = self.watermarks.get(self.key(repo_path))
+        return watermark["sha"] if watermark else None
+
+    def get_ingested(self, repo_path: str) -> set:
+        watermark = self.watermarks.get(self.key(repo_path))
+        return set(watermark.get("ingested", [])) if watermark else set()
+
+    def set(self, repo_path: str, sha: str, commits: int, ingested=()) -> None:
+        watermark = self.watermarks.setdefault(self.key(repo_path), {"commits": 0})
+        watermark.update({"sha": sha, "ingested": sorted(ingested), "commits": watermark["commits"] + commits,
+                          "updated": time.strftime("%Y-%m-%dT%H:%M:%S")})
+        self.save()
+
+    def save(self) -> None:
+        # written to a temporary file first so that an interrupted run never leaves a truncated file behind
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.watermarks, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def ingest_repository(repo_path: str, watermarks: WatermarkStore, classifier: CommitClassifier = None,
+                      batch_size: int = 1000, executor=None, full: bool = False) -> Iterator[pd.DataFrame]:
+    """
+    classify the commits of a repository that are newer than its watermark, batch by batch. Each yielded DataFrame has
+    the columns of CommitClassifier.get_results() plus sha, time, repo and origin_diff_link (empty unless the origin
+    remote is on GitHub). Once a batch has been consumed its commits are recorded as ingested, so an interrupted run
+    resumes after the last full batch without ingesting any commit twice. With merges, a batch can end at a commit that
+    is not a descendant of everything ingested before it; the watermark then stays where it is and the commits beyond
+    it are remembered by SHA until a later batch ends at a commit that descends from all of them. If the watermark is
+    no longer part of the history (e.g. after a force push) or full is set, every commit is ingested again
+    """
+    classifier = CommitClassifier([]) if classifier is None else classifier
+    since = None if full else watermarks.get(repo_path)
+    ingested = set() if full else watermarks.get_ingested(repo_path)
+    if since is not None and not is_ancestor(repo_path, since):
+        warnings.warn("watermark {} is not an ancestor of HEAD in {}, ingesting all commits".format(since, repo_path))
+        since, ingested = None, set()
+    name = repo_name(repo_path)
+    github = is_github_repo(repo_path)
+    # the commits streamed so far (and the watermark) that no streamed commit has as parent: every streamed commit is
+    # an ancestor of one of them, so once last_sha is the only one it descends from everything ingested
+    tips = {since} if since else set()
+    for commits in iter_commits(repo_path, since, batch_size):
+        last_sha = commits["sha"].iat[-1]
+        for sha, parents in zip(commits["sha"], commits["parents"]):
+            tips.difference_update(parents)
+            tips.add(sha)
+        commits = commits[~commits["sha"].isin(ingested)].reset_index(drop=True)
+        if len(commits):
+            preprocessed_msgs, why_subcategory, what_subcategory = (
+                list(column) for column in zip(*classifier.classify_unique(commits["msg"].tolist(), executor)))
+            results = build_results(commits["msg"].tolist(), preprocessed_msgs, why_subcategory, what_subcategory)
+            results["sha"] = commits["sha"]
+            results["time"] = commits["time"]
+            results["repo"] = name
+            results["origin_diff_link"] = origin_diff_links(results["repo"], results["sha"]) if github else ""
+            yield results
+            ingested.update(commits["sha"])
+        # every commit up to last_sha has been ingested, since parents come first; if all ingested commits and the
+        # watermark are ancestors of last_sha, it can replace them as the watermark
+        if tips == {last_sha}:
+            since, ingested = last_sha, set()
+        watermarks.set(repo_path, since, len(commits), ingested)
+
+
+if __name__ == "__main__":
+    from classfier.CommitClassfier import create_classifier_pool
+    from util.CommitUtil import ensure_nltk_resources
+
+    parser = argparse.ArgumentParser(description="classify the new commits of local git repositories")
+    parser.add_argument("repos", nargs="+", help="paths of local git repositories")
+    parser.add_argument("--watermarks", default="watermarks.json", help="JSON file with the last ingested commits")
+    parser.add_argument("--output", default="ingested.csv", help="CSV file the results are appended to")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--full", action="store_true", help="ignore the watermarks and ingest every commit")
+    args = parser.parse_args()
+
+    ensure_nltk_resources(download=True)
+    store = WatermarkStore(args.watermarks)
+    pool = create_classifier_pool(args.workers) if args.workers > 1 else None
+    try:
+        for repo in args.repos:
+            for batch in ingest_repository(repo, store, batch_size=args.batch_size, executor=pool, full=args.full):
+                batch.to_csv(args.output, mode="a", index=False, header=not os.path.exists(args.output))
+                print("{}: {} commits up to {}".format(repo, len(batch), batch["sha"].iat[-1]))
+    finally:
+        if pool is not None:
+            pool.shutdown()
@@ -1,9 +1,13 @@
 import pandas as pd
+import numpy as np
 import os
 import csv
 
-from util.CommitUtil import stem_tokenize
-from preprocessing.CategoryOrganization import languages
+from project_path import ROOT_DIR
+from util.CommitUtil import stem_tokenize, ensure_nltk_resources
+from preprocessing.CategoryOrganization import languages, CATEGORY_COLUMN
+
+CODE_DICT_FILE = os.path.join(ROOT_DIR, "data/intercoder/categories.csv")
 
 
 def get_code_dict(file_name: str) -> dict:
@@ -16,41 +20,125 @@ def get_code_dict(file_name: str) -> dict:
     return categories
 
 
-code_dict = get_code_dict('../../data/intercoder/categories.csv')
+_code_dict = None
+
+
+def get_default_code_dict() -> dict:
+    """
+    return the codes of data/intercoder/categories.csv, read on first use
+    """
+    global _code_dict
+    if _code_dict is None:
+        _code_dict = get_code_dict(CODE_DICT_FILE)
+    return _code_dict
+
+
+def __getattr__(name: str):
+    # code_dict was read at import, it is still available under its old name but read on first use
+    if name == "code_dict":
+        return get_default_code_dict()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+_stemmed_code_index = None
+
+
+def get_stemmed_code_index() -> dict:
+    """
+    return the keys of the default code dict by their stemmed tokens; if two keys stem alike the first one is kept,
+    as rough_match used to return the first matching key
+    """
+    global _stemmed_code_index
+    if _stemmed_code_index is None:
+        _stemmed_code_index = {}
+        for key in get_default_code_dict():
+            _stemmed_code_index.setdefault(tuple(stem_tokenize(key)), key)
+    return _stemmed_code_index
 
 
 def rough_match(category_name) -> str:
-    for key in code_dict:
-        if stem_tokenize(category_name) == stem_tokenize(key):
-            return key
-    return category_name
+    return get_stemmed_code_index().get(tuple(stem_tokenize(category_name)), category_name)
 
 
 def clean(file_name: str):
     df = pd.read_csv(file_name)
     df = df.iloc[:, :10].dropna(how='any', axis=0)
+    # every distinct cell is matched once
+    matches = {cell: rough_match(cell) for cell in pd.unique(df.iloc[:, 2:].to_numpy().ravel())}
     for col in df.columns[2:]:
-        df[col] = df[col].apply(lambda x: rough_match(x))
+        df[col] = df[col].map(matches)
     return df
 
 
 def code(file_name: str):
     df = pd.read_excel(file_name, index_col=None)
     df = df.dropna(how='any', axis=0)
+    code_dict = get_default_code_dict()
     for col in df.columns[2:]:
-        df[col] = df[col].apply(lambda x: code_dict.get(x, 0))
+        df[col] = df[col].map(code_dict).fillna(0).astype(np.int64)
     return df
 
 
+def cohen_kappa(first: np.ndarray, second: np.ndarray) -> float:
+    """
+    return Cohen's kappa of two coders' codes for the same items
+    """
+    codes, labels = np.unique(np.concatenate([first, second]), return_inverse=True)
+    n_items = len(first)
+    confusion = np.bincount(labels[:n_items] * len(codes) + labels[n_items:], minlength=len(codes) ** 2)
+    confusion = confusion.reshape(len(codes), len(codes)) / n_items
+    observed = np.trace(confusion)
+    expected = confusion.sum(axis=1) @ confusion.sum(axis=0)
+    return 1.0 if expected == 1 else float((observed - expected) / (1 - expected))
+
+
+def fleiss_kappa(ratings: np.ndarray) -> float:
+    """
+    return Fleiss' kappa of an items x coders array of codes
+    """
+    n_items, n_coders = ratings.shape
+    _, labels = np.unique(ratings, return_inverse=True)
+    labels = labels.reshape(n_items, n_coders)
+    n_codes = labels.max() + 1
+    counts = np.zeros((n_items, n_codes))
+    np.add.at(counts, (np.repeat(np.arange(n_items), n_coders), labels.ravel()), 1)
+    observed = ((counts * (counts - 1)).sum(axis=1) / (n_coders * (n_coders - 1))).mean()
+    proportions = counts.sum(axis=0) / (n_items * n_coders)
+    expected = (proportions ** 2).sum()
+    return 1.0 if expected == 1 else float((observed - expected) / (1 - expected))
+
+
+def intercoder_agreement(coded: dict) -> pd.DataFrame:
+    """
+    return Cohen's and Fleiss' kappa of every category and language (and of all languages together) from the coded
+    frames by language, whose columns hold the codes of the two coders for each of CATEGORY_COLUMN side by side
+    """
+    rows = []
+    frames = {**coded, 'all': pd.concat(coded.values(), ignore_index=True)}
+    for lan, df in frames.items():
+        codes = df.to_numpy()
+        for position, category in enumerate(CATEGORY_COLUMN):
+            ratings = codes[:, 2 * position:2 * position + 2]
+            rows.append({'language': lan, 'category': category, 'items': len(ratings),
+                         'agreement': float((ratings[:, 0] == ratings[:, 1]).mean()),
+                         'cohen_kappa': cohen_kappa(ratings[:, 0], ratings[:, 1]),
+                         'fleiss_kappa': fleiss_kappa(ratings)})
+    return pd.DataFrame(rows)
+
+
 if __name__ == '__main__':
+    ensure_nltk_resources(download=True)
     os.chdir('../../data/intercoder')
     for lan in languages:
         csv_name = '../labelled/{}.csv'.format(lan)
         df_cleaned = clean(csv_name)
         df_cleaned.to_excel('cleaned_{}.xlsx'.format(lan), index=False)
 
+    coded = {}
     for lan in languages:
         excel_name = 'cleaned_{}.xlsx'.format(lan)
         df_coded = code(excel_name)
         df_coded.to_excel('coded_original_{}.xlsx'.format(lan), index=False)
         df_coded.iloc[:, 2:].to_csv('coded_{}.csv'.format(lan), index=False)
+        coded[lan] = df_coded.iloc[:, 2:]
+    print(intercoder_agreement(coded))
@@ -0,0 +1,169 @@
+import ast
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# A dataset is a directory with a schema.json and one or more .npy files per column, named after the column's position
+# (c<i>) since column names need not be valid file names:
+# - "string" columns: the UTF-8 bytes of all values back to back (c<i>.data.npy) and the start offset of every value
+#   plus the end of the last one (c<i>.offsets.npy); missing values are marked in c<i>.null.npy if there are any
+# - "category_list" columns: the vocabulary in the schema, the codes of all list items back to back (c<i>.codes.npy)
+#   and the start offset of every list (c<i>.offsets.npy)
+# - "array" columns: the numeric or boolean values as they are (c<i>.npy)
+# Every .npy file can be memory-mapped, so reading a column only touches that column's files
+SCHEMA_FILE = "schema.json"
+FORMAT_VERSION = 1
+
+
+def _column_kind(series: pd.Series) -> str:
+    if series.dtype.kind in "biuf":
+        return "array"
+    values = series.dropna()
+    if len(values) and values.map(lambda value: isinstance(value, (list, tuple))).all():
+        return "category_list"
+    return "string"
+
+
+def encode_strings(values) -> tuple:
+    """
+    return the UTF-8 byte arena, the offsets and the null mask of an iterable of strings (None or NaN for missing)
+    """
+    encoded = []
+    nulls = []
+    for value in values:
+        missing = value is None or (isinstance(value, float) and np.isnan(value))
+        nulls.append(missing)
+        encoded.append(b"" if missing else str(value).encode("utf-8", "surrogatepass"))
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return data, offsets, np.array(nulls, dtype=bool)
+
+
+def decode_strings(data: np.ndarray, offsets: np.ndarray, nulls: np.ndarray = None, start: int = 0,
+                   stop: int = None) -> list:
+    """
+    return the strings start:stop of a UTF-8 byte arena
+    """
+    stop = len(offsets) - 1 if stop is None else stop
+    raw = data[offsets[start]:offsets[stop]].tobytes()
+    base = offsets[start]
+    values = [raw[begin - base:end - base].decode("utf-8", "surrogatepass")
+              for begin, end in zip(offsets[start:stop].tolist(), offsets[start + 1:stop + 1].tolist())]
+    if nulls is not None:
+        for i in np.flatnonzero(nulls[start:stop]):
+            values[i] = None
+    return values
+
+
+def write_dataset(df: pd.DataFrame, path: str) -> None:
+    """
+    write df as a columnar dataset directory at path. Columns holding lists are stored as category lists, numeric and
+    boolean columns as arrays and everything else as strings
+    """
+    os.makedirs(path, exist_ok=True)
+    schema = {"version": FORMAT_VERSION, "rows": len(df), "columns": []}
+    for position, column in enumerate(df.columns):
+        series = df[column]
+        kind = _column_kind(series)
+        file_stem = os.path.join(path, "c{}".format(position))
+        entry = {"name": str(column), "kind": kind, "file": os.path.basename(file_stem)}
+        if kind == "array":
+            np.save(file_stem + ".npy", series.to_numpy())
+        elif kind == "string":
+            data, offsets, nulls = encode_strings(series.tolist())
+            np.save(file_stem + ".data.npy", data)
+            np.save(file_stem + ".offsets.npy", offsets)
+            if nulls.any():
+                np.save(file_stem + ".null.npy", nulls)
+                entry["nullable"] = True
+        else:
+            lists = [list(value) if isinstance(value, (list, tuple)) else [] for value in series.tolist()]
+            # the offsets count every item, so a missing item cannot be dropped without shifting the following rows
+            bad_rows = [row for row, value in enumerate(lists) if any(pd.isna(item) for item in value)]
+            if bad_rows:
+                raise ValueError("column {} has missing list items in rows {}".format(column, bad_rows[:10]))
+            exploded = pd.Series(lists, dtype=object).explode().dropna()
+            codes, vocabulary = pd.factorize(exploded)
+            offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+            np.cumsum([len(value) for value in lists], out=offsets[1:])
+            np.save(file_stem + ".codes.npy", codes.astype(np.int32))
+            np.save(file_stem + ".offsets.npy", offsets)
+            entry["vocabulary"] = [str(value) for value in vocabulary]
+        schema["columns"].append(entry)
+    with open(os.path.join(path, SCHEMA_FILE), "w") as f:
+        json.dump(schema, f, indent=2)
+
+
+def read_schema(path: str) -> dict:
+    with open(os.path.join(path, SCHEMA_FILE)) as f:
+        schema = json.load(f)
+    if schema.get("version") != FORMAT_VERSION:
+        raise ValueError("unsupported columnar dataset version {} in {}".format(schema.get("version"), path))
+    return schema
+
+
+def _load(path: str, file_name: str, mmap: bool) -> np.ndarray:
+    return np.load(os.path.join(path, file_name), mmap_mode="r" if mmap else None)
+
+
+def read_string_column(path: str, column: str, mmap: bool = True) -> tuple:
+    """
+    return the byte arena, offsets and null mask (or None) of a string column, memory-mapped by default
+    """
+    entry = _column_entry(read_schema(path), column)
+    if entry["kind"] != "string":
+        raise ValueError("column {} of {} is not a string column".format(column, path))
+    nulls = _load(path, entry["file"] + ".null.npy", mmap) if entry.get("nullable") else None
+    return _load(path, entry["file"] + ".data.npy", mmap), _load(path, entry["file"] + ".offsets.npy", mmap), nulls
+
+
+def _column_entry(schema: dict, column: str) -> dict:
+    for entry in schema["columns"]:
+        if entry["name"] == column:
+            return entry
+    raise KeyError("no column {}".format(column))
+
+
+def read_dataset(path: str, columns: list[str] = None, mmap: bool = True) -> pd.DataFrame:
+    """
+    read the given columns (all by default) of a columnar dataset; only the files of these columns are read
+    """
+    schema = read_schema(path)
+    entries = schema["columns"] if columns is None else [_column_entry(schema, column) for column in columns]
+    data = {}
+    for entry in entries:
+        if entry["kind"] == "array":
+            data[entry["name"]] = np.array(_load(path, entry["file"] + ".npy", mmap))
+        elif entry["kind"] == "string":
+            data[entry["name"]] = pd.Series(decode_strings(*read_string_column(path, entry["name"], mmap)))
+        else:
+            codes = np.asarray(_load(path, entry["file"] + ".codes.npy", mmap))
+            offsets = np.asarray(_load(path, entry["file"] + ".offsets.npy", mmap))
+            vocabulary = np.array(entry["vocabulary"], dtype=object)
+            items = vocabulary[codes].tolist()
+            data[entry["name"]] = pd.Series([items[begin:end] for begin, end in zip(offsets[:-1], offsets[1:])],
+                                            dtype=object)
+    return pd.DataFrame(data, index=pd.RangeIndex(schema["rows"]))
+
+
+def _parse_list_cell(cell, separator: str) -> list:
+    if not isinstance(cell, str):
+        return []
+    if cell.startswith("["):
+        return ast.literal_eval(cell)
+    return [item.replace(u'\ufeff', '') for item in cell.split(separator)]
+
+
+def convert_file(file_name: str, path: str, list_columns: list[str] = (), separator: str = "; ") -> pd.DataFrame:
+    """
+    convert a CSV or XLSX file into a columnar dataset at path. The cells of list_columns are parsed as Python list
+    literals (as written by the xlsx export of the eval sets) or else split on separator
+    """
+    df = pd.read_excel(file_name, index_col=None) if file_name.endswith(".xlsx") else pd.read_csv(file_name)
+    for column in list_columns:
+        df[column] = df[column].map(lambda cell: _parse_list_cell(cell, separator))
+    write_dataset(df, path)
+    return df
@@ -1,34 +1,178 @@
+import pickle
 import re
+from collections import OrderedDict
 
-import contractions
-import nltk
-from bs4 import BeautifulSoup
-from nltk import word_tokenize, RegexpTokenizer
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer, WordNetLemmatizer
+# nltk, bs4 and contractions are slow to import, so they are imported on first use. The NLTK data is looked up locally
+# when first needed and only downloaded by an explicit ensure_nltk_resources(download=True)
+NLTK_RESOURCES = {
+    "punkt": "tokenizers/punkt",
+    "stopwords": "corpora/stopwords",
+    "wordnet": "corpora/wordnet",
+}
+_found_resources = set()
 
-nltk.download("punkt", quiet=True, raise_on_error=True)
-nltk.download("stopwords", quiet=True, raise_on_error=True)
-nltk.download("wordnet", quiet=True, raise_on_error=True)
+
+def require_nltk_resource(name: str, download: bool = False) -> None:
+    """
+    make sure the NLTK resource is installed locally, downloading it only if download is True
+    """
+    if name in _found_resources:
+        return
+    import nltk
+
+    try:
+        nltk.data.find(NLTK_RESOURCES[name])
+    except LookupError:
+        if not download:
+            raise LookupError(
+                "NLTK resource '{}' is not installed, run ensure_nltk_resources(download=True) or "
+                "python -m nltk.downloader {}".format(name, name)
+            )
+        nltk.download(name, quiet=True, raise_on_error=True)
+    _found_resources.add(name)
+
+
+def ensure_nltk_resources(download: bool = False) -> None:
+    for name in NLTK_RESOURCES:
+        require_nltk_resource(name, download)
+
+
+class LRUCache:
+    """
+    Bounded mapping that evicts the least recently used entry once maxsize is reached, and counts hits and misses
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        if key in self.data:
+            self.data.move_to_end(key)
+            self.hits += 1
+            return self.data[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value) -> None:
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def clear(self) -> None:
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {"size": len(self.data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+# commit vocabulary is heavily skewed towards a few words, so stems, lemmas and message tokens are memoized
+token_cache = LRUCache(2 ** 14)
+stem_cache = LRUCache(2 ** 16)
+lemma_cache = LRUCache(2 ** 16)
+
+_word_tokenize = None
+_stemmer = None
+_lemmatizer = None
+
+
+def word_tokenize(text: str) -> list[str]:
+    global _word_tokenize
+    if _word_tokenize is None:
+        require_nltk_resource("punkt")
+        from nltk import word_tokenize as nltk_word_tokenize
+
+        _word_tokenize = nltk_word_tokenize
+    return _word_tokenize(text)
+
+
+def tokenize(commit_msg: str) -> tuple:
+    tokens = token_cache.get(commit_msg)
+    if tokens is None:
+        tokens = tuple(word_tokenize(commit_msg))
+        token_cache.put(commit_msg, tokens)
+    return tokens
+
+
+def stem(token: str) -> str:
+    global _stemmer
+    stemmed = stem_cache.get(token)
+    if stemmed is None:
+        if _stemmer is None:
+            from nltk.stem import PorterStemmer
+
+            _stemmer = PorterStemmer()
+        stemmed = _stemmer.stem(token)
+        stem_cache.put(token, stemmed)
+    return stemmed
+
+
+def lemmatize(token: str) -> str:
+    global _lemmatizer
+    lemma = lemma_cache.get(token)
+    if lemma is None:
+        if _lemmatizer is None:
+            require_nltk_resource("wordnet")
+            from nltk.stem import WordNetLemmatizer
+
+            _lemmatizer = WordNetLemmatizer()
+        lemma = _lemmatizer.lemmatize(token)
+        lemma_cache.put(token, lemma)
+    return lemma
 
 
 def stem_tokenize(commit_msg: str) -> list[str]:
-    tokenizer = PorterStemmer()
-    return [tokenizer.stem(token) for token in word_tokenize(commit_msg)]
+    return [stem(token) for token in tokenize(commit_msg)]
 
 
 def lemma_tokenize(commit_msg: str) -> list[str]:
-    tokenizer = WordNetLemmatizer()
-    return [tokenizer.lemmatize(token) for token in word_tokenize(commit_msg)]
+    return [lemmatize(token) for token in tokenize(commit_msg)]
+
+
+def cache_stats() -> dict:
+    """
+    return the size and hit/miss counters of the token, stem and lemma caches
+    """
+    return {"token": token_cache.stats(), "stem": stem_cache.stats(), "lemma": lemma_cache.stats()}
+
+
+def save_caches(path: str) -> None:
+    """
+    persist the token, stem and lemma caches, e.g. to warm up pool workers with load_caches
+    """
+    with open(path, "wb") as f:
+        pickle.dump({"token": token_cache.data, "stem": stem_cache.data, "lemma": lemma_cache.data}, f)
+
+
+def load_caches(path: str) -> None:
+    """
+    load caches saved by save_caches, keeping the entries already cached in this process
+    """
+    with open(path, "rb") as f:
+        saved = pickle.load(f)
+    for name, cache in (("token", token_cache), ("stem", stem_cache), ("lemma", lemma_cache)):
+        for key, value in saved.get(name, {}).items():
+            if key not in cache.data:
+                cache.put(key, value)
 
 
 def regex_tokenize(commit_msg: str) -> list[str]:
+    from nltk import RegexpTokenizer
+
     tokenizer = RegexpTokenizer(r"\w+")
     return tokenizer.tokenize(commit_msg)
 
 
 def remove_stop_words(text: str) -> str:
     """Remove the noisy text in the text"""
+    require_nltk_resource("stopwords")
+    from nltk.corpus import stopwords
+
     stops = stopwords.words("english")
     stop_transformed = word_tokenize(" ".join(stops))
     text = text.lower()
@@ -41,17 +185,71 @@ def remove_stop_words(text: str) -> str:
     return text_rm
 
 
+# BeautifulSoup only changes text that contains markup or character references
+_HTML_TRIGGER = re.compile(r"[<&]")
+
+_contraction_trigger = None
+
+
+def get_contraction_trigger():
+    """
+    contractions.fix only rewrites a key that stands between non-alphanumeric characters. Every key either contains an
+    apostrophe or starts with a word, so text without apostrophes and without any of these leading words is unchanged
+    """
+    global _contraction_trigger
+    if _contraction_trigger is None:
+        import contractions
+
+        heads = sorted(
+            {
+                re.match(r"\w+", key.lower()).group()
+                for table in (contractions.contractions_dict, contractions.leftovers_dict, contractions.slang_dict)
+                for key in table
+                if "'" not in key and "’" not in key
+            }
+        )
+        _contraction_trigger = re.compile(
+            r"['’]|(?<![A-Za-z0-9_])(?:{})(?![A-Za-z0-9_])".format("|".join(map(re.escape, heads)))
+        )
+    return _contraction_trigger
+
+
+_PUNCTUATION_TABLE = str.maketrans(dict.fromkeys("\'\"!”#$%&’()+,/:;?@[]^_`{|}~\\", " "))
+
+
 def denoise(text: str) -> str:
     """Remove the noisy text in the text"""
     text = text.lower()
     # remove html parser
-    soup = BeautifulSoup(text, "html.parser")
-    text = soup.get_text()
+    if _HTML_TRIGGER.search(text):
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(text, "html.parser")
+        text = soup.get_text()
     # replace contractions in string of text
-    text = contractions.fix(text)
-    # remove the regex \t \s
-    text = re.sub(r"[\n\t\s]", " ", text)
-    # remove punctuation
+    if get_contraction_trigger().search(text):
+        import contractions
+
+        text = contractions.fix(text)
+    # remove punctuation, the final split also normalizes \t \n \s
     # text = re.sub(r'[\'\"!”#$%&’()*+,-./:;<=>?@[\]^_`{|}~\\]', ' ', text)
-    text = re.sub(r"[\'\"!”#$%&’()+,/:;?@[\]^_`{|}~\\]", " ", text)
+    text = text.translate(_PUNCTUATION_TABLE)
     return " ".join(text.split())
+
+
+def denoise_series(texts):
+    """
+    denoise a pandas Series of texts column-wise, with the same result as applying denoise to every text
+    """
+    texts = texts.str.lower()
+    html = texts.str.contains(_HTML_TRIGGER).to_numpy(dtype=bool)
+    if html.any():
+        from bs4 import BeautifulSoup
+
+        texts[html] = texts[html].map(lambda text: BeautifulSoup(text, "html.parser").get_text())
+    contraction = texts.str.contains(get_contraction_trigger()).to_numpy(dtype=bool)
+    if contraction.any():
+        import contractions
+
+        texts[contraction] = texts[contraction].map(contractions.fix)
+    return texts.str.translate(_PUNCTUATION_TABLE).str.split().str.join(" ")
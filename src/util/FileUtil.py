@@ -1,4 +1,7 @@
+def getKeywordListFromFile(file_path: str) -> list[str]:
+    with open(file_path) as f:
+        return f.read().splitlines()
+
+
 def getKeywordFromFile(file_path: str) -> str:
-    f = open(file_path)
-    keywords = f.read().splitlines()
-    return "|".join(keywords)
+    return "|".join(getKeywordListFromFile(file_path))
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+from project_path import ROOT_DIR
+
+# cold import budget in seconds of each module, measured in a fresh interpreter. pandas alone takes most of the
+# classifier budget; nltk, bs4 and contractions must not be imported until they are first used
+IMPORT_TIME_BUDGET = {
+    "util.CommitUtil": 0.1,
+    "classfier.CommitClassfier": 1.0,
+    "preprocessing.InterCoderPreprocessor": 1.0,
+    "evaluation.ClassiferEvaluation": 1.0,
+}
+LAZY_MODULES = ["nltk", "bs4", "contractions"]
+
+_MEASURE_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(name for name in {lazy_modules!r} if name in sys.modules))
+"""
+
+
+def measure_import_time(module: str) -> tuple:
+    """
+    return the seconds it takes to import module in a fresh interpreter, and the lazy modules it imported eagerly
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT_DIR, os.path.join(ROOT_DIR, "src"), env.get("PYTHONPATH", "")])
+    output = subprocess.run(
+        [sys.executable, "-c", _MEASURE_SCRIPT.format(module=module, lazy_modules=LAZY_MODULES)],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    return float(output[0]), output[1].split(",") if len(output) > 1 else []
+
+
+def check_import_budget(budget: dict = None) -> bool:
+    """
+    print the import time of every module against its budget, return False if any module is over budget or imports
+    one of the lazy modules
+    """
+    budget = IMPORT_TIME_BUDGET if budget is None else budget
+    within_budget = True
+    for module, limit in budget.items():
+        elapsed, eager_modules = measure_import_time(module)
+        ok = elapsed <= limit and not eager_modules
+        within_budget = within_budget and ok
+        print("{:<40} {:.3f}s / {:.3f}s {} {}".format(
+            module, elapsed, limit, "ok" if ok else "OVER BUDGET", " ".join(eager_modules)))
+    return within_budget
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_import_budget() else 1)
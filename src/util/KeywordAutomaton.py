@@ -0,0 +1,70 @@
+from collections import deque
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over literal keywords. Every keyword is attached to one or more labels, and find_labels
+    returns the labels of all keywords occurring in a text in a single left-to-right scan, so the cost depends on the
+    length of the text and not on the number of keywords. Matching is case sensitive
+    """
+
+    def __init__(self, keyword_labels: dict):
+        """
+        keyword_labels maps each non-empty keyword to an iterable of labels
+        """
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [frozenset()]
+        outputs = [set()]
+        for keyword, labels in keyword_labels.items():
+            if not keyword:
+                raise ValueError("keywords of the automaton must not be empty")
+            state = 0
+            for ch in keyword:
+                if ch not in self.goto[state]:
+                    self.goto[state][ch] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    outputs.append(set())
+                state = self.goto[state][ch]
+            outputs[state].update(labels)
+
+        # breadth-first pass to set the failure links and merge the outputs of the suffix states; the states right
+        # below the root keep the root as their failure link
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(ch, 0)
+                outputs[next_state] |= outputs[self.fail[next_state]]
+        self.output = [frozenset(labels) for labels in outputs]
+
+    @classmethod
+    def from_tables(cls, goto: list, fail: list, output: list) -> "KeywordAutomaton":
+        """
+        return an automaton from the goto, fail and output tables of one built before, without building it again
+        """
+        automaton = cls.__new__(cls)
+        automaton.goto = goto
+        automaton.fail = fail
+        automaton.output = [frozenset(labels) for labels in output]
+        return automaton
+
+    def find_labels(self, text: str) -> set:
+        """
+        return the labels of every keyword that occurs in text
+        """
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                found |= output[state]
+        return found
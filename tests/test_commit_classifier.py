@@ -0,0 +1,33 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from classfier.CommitClassfier import CommitClassifier
+from util.CommitUtil import ensure_nltk_resources
+
+
+def nltk_resources_installed() -> bool:
+    try:
+        ensure_nltk_resources()
+    except LookupError:
+        return False
+    return True
+
+
+@unittest.skipUnless(nltk_resources_installed(), "the preprocessing needs the NLTK data")
+class ClassifyFrameTest(unittest.TestCase):
+    def test_missing_message_is_classified_as_empty(self):
+        df = pd.DataFrame({"message": ["fix the crash on startup", np.nan, "add tests for the parser"]},
+                          index=[10, 11, 12])
+        results = CommitClassifier([]).classify_frame(df)
+        expected = CommitClassifier([]).classify_frame(pd.DataFrame({"message": [""]}))
+        self.assertEqual(results.loc[11, "preprocessed"], "")
+        for column in ("why_subcategory", "what_subcategory", "good_classified"):
+            self.assertEqual(results.loc[11, column], expected[column].iat[0])
+        self.assertNotEqual(results.loc[11, "preprocessed"], results.loc[12, "preprocessed"])
+        self.assertTrue(pd.isna(results.loc[11, "message"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import json
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from preprocessing.CommitMessagePreprocessor import SHARD_COLUMNS, read_raw_chunks, read_run, write_run
+
+MESSAGES = ["fix\rtypo", "first line\n\nbody", 'say "hi"', "a, b and c", "\r\n", ""]
+
+
+class ShardRunTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_run_round_trip(self):
+        df = pd.DataFrame({"length": [len(msg) for msg in MESSAGES], "seq": range(len(MESSAGES)),
+                           "id": [str(i) for i in range(len(MESSAGES))], "msg": MESSAGES,
+                           "origin_diff_link": "https://github.com/owner/repo/commit/abc", "repo": "owner/repo",
+                           "sha": "abc"})
+        path = os.path.join(self.tmp_dir.name, "run.csv")
+        write_run(df, path)
+        rows = list(read_run(path))
+        self.assertEqual([key for key, _ in rows], [(len(msg), seq) for seq, msg in enumerate(MESSAGES)])
+        self.assertEqual([row for _, row in rows], df[SHARD_COLUMNS].values.tolist())
+
+    def test_jsonl_keeps_raw_columns(self):
+        path = os.path.join(self.tmp_dir.name, "raw.jsonl")
+        with open(path, "w") as f:
+            for i, msg in enumerate(MESSAGES):
+                f.write(json.dumps({"msg": msg, "repo": "owner/repo", "sha": str(i), "diff": "+ line"}) + "\n")
+        chunks = list(read_raw_chunks(path, chunk_size=4))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 2])
+        self.assertEqual(sorted(chunks[0].columns), ["id", "msg", "repo", "sha"])
+        self.assertEqual(pd.concat(chunks)["msg"].tolist(), MESSAGES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+from preprocessing.GitIngestion import WatermarkStore, ingest_repository, iter_commits
+
+
+class EchoClassifier:
+    """
+    Stands in for CommitClassifier: every message is its own preprocessed form and has no category
+    """
+
+    def classify_unique(self, commit_msgs, executor=None):
+        return [(commit_msg, ["Missing Why"], ["Missing What"]) for commit_msg in commit_msgs]
+
+
+def git(repo_path, *args, date=None):
+    env = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com", GIT_COMMITTER_NAME="test",
+               GIT_COMMITTER_EMAIL="test@example.com")
+    if date is not None:
+        env.update(GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date)
+    return subprocess.run(["git", "-C", repo_path, *args], capture_output=True, text=True, check=True,
+                          env=env).stdout.strip()
+
+
+def commit(repo_path, msg, date):
+    git(repo_path, "commit", "--allow-empty", "-q", "-m", msg, date=date)
+    return git(repo_path, "rev-parse", "HEAD")
+
+
+class GitIngestionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.repo, self.store = self.make_repo("repo")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_repo(self, name):
+        repo = os.path.join(self.tmp_dir.name, name)
+        os.makedirs(repo)
+        git(repo, "init", "-q", "-b", "main")
+        # base -> s1 -> s2 on a side branch and base -> m1 -> m2 on main, committed interleaved, then merged
+        commit(repo, "base", "2020-01-01T00:00:00")
+        git(repo, "checkout", "-q", "-b", "side")
+        commit(repo, "s1", "2020-01-02T00:00:00")
+        git(repo, "checkout", "-q", "main")
+        commit(repo, "m1", "2020-01-03T00:00:00")
+        git(repo, "checkout", "-q", "side")
+        commit(repo, "s2", "2020-01-04T00:00:00")
+        git(repo, "checkout", "-q", "main")
+        commit(repo, "m2", "2020-01-05T00:00:00")
+        git(repo, "merge", "-q", "--no-ff", "-m", "merge", "side", date="2020-01-06T00:00:00")
+        return repo, WatermarkStore(os.path.join(self.tmp_dir.name, name + ".json"))
+
+    def ingest(self, repo, store, batch_size, max_batches=None):
+        """
+        ingest the commits of repo, stopping once max_batches batches have been consumed
+        """
+        msgs = []
+        for i, batch in enumerate(ingest_repository(repo, store, EchoClassifier(), batch_size)):
+            if max_batches is not None and i == max_batches:
+                break
+            msgs += batch["message"].tolist()
+        return msgs
+
+    def test_resume_after_merge_ingests_every_commit_once(self):
+        for max_batches in (1, 2):
+            with self.subTest(max_batches=max_batches):
+                repo, store = self.make_repo("repo{}".format(max_batches))
+                first = self.ingest(repo, store, 2, max_batches)
+                self.assertEqual(len(first), 2 * max_batches)
+                rest = self.ingest(repo, store, 2)
+                self.assertCountEqual(first + rest, ["base", "s1", "m1", "s2", "m2", "merge"])
+                self.assertEqual(store.watermarks[WatermarkStore.key(repo)]["commits"], 6)
+                self.assertEqual(store.get(repo), git(repo, "rev-parse", "HEAD"))
+                self.assertEqual(self.ingest(repo, store, 2), [])
+
+    def test_new_commits_after_resume(self):
+        self.ingest(self.repo, self.store, 4)
+        commit(self.repo, "after", "2020-01-07T00:00:00")
+        self.assertEqual(self.ingest(self.repo, self.store, 4), ["after"])
+        self.assertEqual(self.store.get(self.repo), git(self.repo, "rev-parse", "HEAD"))
+
+    def test_parents_before_children_despite_clock_skew(self):
+        commit(self.repo, "child", "2019-01-01T00:00:00")
+        msgs = [msg for batch in iter_commits(self.repo) for msg in batch["msg"]]
+        self.assertLess(msgs.index("merge"), msgs.index("child"))
+        self.assertEqual(msgs[0], "base")
+
+    def test_git_error_is_reported(self):
+        with self.assertRaisesRegex(RuntimeError, "0{40}"):
+            list(iter_commits(self.repo, "0" * 40))
+
+    def test_no_link_without_github_remote(self):
+        batch = next(ingest_repository(self.repo, self.store, EchoClassifier(), 10))
+        self.assertTrue((batch["origin_diff_link"] == "").all())
+        git(self.repo, "remote", "add", "origin", "git@github.com:owner/repo.git")
+        batch = next(ingest_repository(self.repo, self.store, EchoClassifier(), 10, full=True))
+        self.assertEqual(batch["origin_diff_link"].iat[0], "https://github.com/owner/repo/commit/" + batch["sha"].iat[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
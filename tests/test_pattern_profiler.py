@@ -0,0 +1,32 @@
+import importlib.util
+import re
+import time
+import unittest
+
+from classfier.PatternProfiler import PatternProfiler
+
+# backtracks exponentially in the length of the run of "a"s before failing at the "!"
+PATHOLOGICAL_PATTERN = re.compile(r"(a|aa)+$")
+PATHOLOGICAL_MESSAGE = "a" * 40 + "!"
+
+
+@unittest.skipUnless(importlib.util.find_spec("regex"), "aborting a search needs the regex module")
+class PatternProfilerBudgetTest(unittest.TestCase):
+    def test_abort_interrupts_a_runaway_search(self):
+        profiler = PatternProfiler(budget=0.05, on_budget="abort")
+        profiler.start_message(PATHOLOGICAL_MESSAGE)
+        start = time.perf_counter()
+        self.assertIsNone(profiler.search("pathological", PATHOLOGICAL_PATTERN, PATHOLOGICAL_MESSAGE))
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertTrue(profiler.budget_exhausted())
+        self.assertEqual(profiler.report()["over_budget"][0]["aborted"], True)
+
+    def test_abort_keeps_matches_within_budget(self):
+        profiler = PatternProfiler(budget=1.0, on_budget="abort")
+        profiler.start_message("fix the parser")
+        self.assertIsNotNone(profiler.search("fix", re.compile(r"\bfix\b"), "fix the parser"))
+        self.assertFalse(profiler.budget_exhausted())
+
+
+if __name__ == "__main__":
+    unittest.main()